@@ -1,23 +1,237 @@
 import json
+import logging
 import os
+import time
 
-SETTINGS_FILE = 'settings.json'
+logger = logging.getLogger(__name__)
+
+SETTINGS_FILE = os.environ.get('PLEX_SYMLINK_SETTINGS', 'settings.json')
+
+# Every setting can also come from the environment, e.g. PLEX_SYMLINK_SRC_DIR; the environment wins
+ENV_PREFIX = 'PLEX_SYMLINK_'
+
+REQUIRED_SETTINGS = ['src_dir', 'dest_dir', 'dest_dir_movies', 'id', 'tmdb_api_key']
+
+# Settings a library definition may override; anything it leaves out comes from the top level
+LIBRARY_SETTINGS = ['src_dir', 'dest_dir', 'dest_dir_movies', 'id', 'relative_links', 'episode_titles',
+                    'plex_url', 'plex_token', 'plex_tv_section_id', 'plex_movie_section_id']
+REQUIRED_LIBRARY_SETTINGS = ['src_dir', 'dest_dir', 'dest_dir_movies', 'id']
+
+# How often the settings file's mtime is checked; everything in between is served from memory
+RELOAD_CHECK_INTERVAL = 2.0
+
+SETTINGS_TYPES = {
+    'src_dir': str,
+    'dest_dir': str,
+    'dest_dir_movies': str,
+    'id': str,
+    'tmdb_api_key': str,
+    'plex_url': str,
+    'plex_token': str,
+    'plex_tv_section_id': str,
+    'plex_movie_section_id': str,
+    'overseer_api_address': str,
+    'overseer_api_key': str,
+    'relative_links': bool,
+    'episode_titles': bool,
+    'webhook_host': str,
+    'webhook_port': int,
+    'poll_interval': int,
+    'libraries': list,
+    'log_level': str,
+    'log_format': str,
+}
+
+_settings = None
+_settings_mtime = None
+_libraries = (None, [])
+_last_check = 0.0
+_subscribers = []
+_headless = os.environ.get(ENV_PREFIX + 'HEADLESS', '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+def set_headless(headless=True):
+    """In headless mode nothing ever prompts on stdin; missing settings are errors instead."""
+    global _headless
+    _headless = headless
+
+def is_headless():
+    return _headless
+
+def env_var_name(key):
+    return ENV_PREFIX + key.upper()
+
+def settings_from_env():
+    settings = {}
+    for key in SETTINGS_TYPES:
+        value = os.environ.get(env_var_name(key))
+        if value is not None:
+            settings[key] = value
+    return settings
+
+def missing_settings(required=REQUIRED_SETTINGS):
+    settings = _load_settings()
+    if not settings.get('libraries'):
+        return [key for key in required if not settings.get(key)]
+    missing = [key for key in required if key not in REQUIRED_LIBRARY_SETTINGS and not settings.get(key)]
+    for library in get_libraries():
+        missing.extend(f"{library['name']}.{key}" for key in REQUIRED_LIBRARY_SETTINGS if not library.get(key))
+    return missing
+
+def get_libraries():
+    """Every library the daemon manages, each a dict with a name plus its LIBRARY_SETTINGS.
+
+    Without a "libraries" list the top-level settings describe the one library.
+    """
+    global _libraries
+    settings = _load_settings()
+    # Built once per settings load, so a bad definition is reported once rather than on every lookup
+    if _libraries[0] is settings:
+        return [dict(library) for library in _libraries[1]]
+    defaults = {key: settings.get(key) for key in LIBRARY_SETTINGS}
+    libraries = []
+    names = set()
+    for index, definition in enumerate(settings.get('libraries') or [{}]):
+        if not isinstance(definition, dict):
+            logger.warning("Ignoring library definition %d: expected an object", index + 1)
+            continue
+        library = dict(defaults)
+        library.update({key: value for key, value in validate_settings(definition).items() if value is not None})
+        src_dir = library.get('src_dir') or ''
+        name = definition.get('name') or os.path.basename(src_dir.rstrip(os.sep)) or f"library{index + 1}"
+        # Mounts like /mnt/a/__all__ and /mnt/b/__all__ share a basename; folders are routed by name
+        library['name'] = name if name not in names else f"{name}-{index + 1}"
+        names.add(library['name'])
+        libraries.append(library)
+    _libraries = (settings, libraries)
+    return [dict(library) for library in libraries]
+
+def library_for_path(path, libraries=None):
+    """The library whose src_dir contains path, or None."""
+    for library in libraries or get_libraries():
+        src_dir = library.get('src_dir')
+        if src_dir and (path == src_dir or path.startswith(src_dir.rstrip(os.sep) + os.sep)):
+            return library
+    return None
+
+def relative_links_for(path, libraries=None, default=False):
+    """The relative_links setting of the library holding path."""
+    library = library_for_path(path, libraries)
+    return bool(library.get('relative_links')) if library else default
+
+def is_inside(path, src_dir):
+    """Whether path is strictly below src_dir; the src_dir root itself is not a torrent folder."""
+    src_dir = os.path.abspath(src_dir)
+    return path != src_dir and path.startswith(src_dir.rstrip(os.sep) + os.sep)
+
+def resolve_folders(libraries, folders):
+    """Route notified folders to libraries: {library name: (existing folders, removed folders)}.
+
+    Absolute paths go to the library whose src_dir holds them. A bare torrent name goes to every
+    library that has such a folder, and counts as removed from all of them when none does.
+    Anything that resolves to a src_dir itself or outside every src_dir is ignored.
+    """
+    routed = {library['name']: ([], []) for library in libraries}
+    for folder in folders:
+        if os.path.isabs(folder):
+            path = os.path.abspath(folder)
+            candidates = [(library, path) for library in libraries
+                          if library.get('src_dir') and is_inside(path, library['src_dir'])][:1]
+        else:
+            candidates = [(library, os.path.abspath(os.path.join(library['src_dir'], folder))) for library in libraries
+                          if library.get('src_dir')]
+            candidates = [(library, path) for library, path in candidates if is_inside(path, library['src_dir'])]
+        if not candidates:
+            logger.warning("Ignoring hook folder outside every library: %s", folder)
+            continue
+        existing = [(library, path) for library, path in candidates if os.path.isdir(path)]
+        if existing:
+            for library, path in existing:
+                routed[library['name']][0].append(path)
+        else:
+            for library, path in candidates:
+                routed[library['name']][1].append(path)
+    return routed
+
+def validate_settings(settings):
+    """Coerce known keys to their expected types, dropping values that can't be used."""
+    validated = {}
+    for key, value in settings.items():
+        expected = SETTINGS_TYPES.get(key)
+        if expected is None or value is None or isinstance(value, expected):
+            validated[key] = value
+        elif expected is bool and isinstance(value, (str, int)):
+            validated[key] = str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+        elif expected is str and isinstance(value, (int, float)):
+            validated[key] = str(value)
+        elif expected is int and isinstance(value, str) and value.strip().isdigit():
+            validated[key] = int(value)
+        elif expected is list and isinstance(value, str):
+            # List settings arrive from the environment as JSON
+            try:
+                validated[key] = json.loads(value)
+            except json.JSONDecodeError:
+                logger.warning("Ignoring setting %s: not a JSON list", key)
+        else:
+            logger.warning("Ignoring setting %s: expected %s, got %s", key, expected.__name__, type(value).__name__)
+    return validated
+
+def subscribe(callback):
+    """Call callback(new_settings, old_settings) whenever the settings change."""
+    _subscribers.append(callback)
+
+def _notify(new_settings, old_settings):
+    for callback in _subscribers:
+        try:
+            callback(new_settings, old_settings)
+        except Exception as e:
+            logger.error("Error in settings subscriber: %s", e)
+
+def _load_settings():
+    global _settings, _settings_mtime, _last_check
+    now = time.monotonic()
+    if _settings is not None and now - _last_check < RELOAD_CHECK_INTERVAL:
+        return _settings
+    _last_check = now
+
+    try:
+        mtime = os.stat(SETTINGS_FILE).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    if _settings is not None and mtime == _settings_mtime:
+        return _settings
+
+    settings = {}
+    try:
+        if mtime is not None:
+            with open(SETTINGS_FILE, "r") as f:
+                settings = json.load(f)
+    except (IOError, json.JSONDecodeError) as e:
+        logger.error("Error loading settings: %s", e)
+        if _settings is not None:
+            # Keep serving the last good settings while the file is mid-edit
+            return _settings
+    settings.update(settings_from_env())
+    settings = validate_settings(settings)
+
+    old_settings = _settings
+    _settings = settings
+    _settings_mtime = mtime
+    if old_settings is not None and old_settings != settings:
+        _notify(settings, old_settings)
+    return _settings
 
 def save_settings(settings):
+    global _last_check
     try:
         with open(SETTINGS_FILE, "w") as f:
             json.dump(settings, f, indent=4)
     except IOError as e:
-        print(f"Error saving settings: {e}")
+        logger.error("Error saving settings: %s", e)
+    # Pick the new file up on the next read instead of waiting for the check interval
+    _last_check = 0.0
 
 def get_settings():
-    try:
-        if os.path.exists(SETTINGS_FILE):
-            with open(SETTINGS_FILE, "r") as f:
-                return json.load(f)
-    except IOError as e:
-        print(f"Error loading settings: {e}")
-    return {}
+    return dict(_load_settings())
 
 def prompt_for_settings():
     settings = {}
@@ -37,16 +251,27 @@ def prompt_for_settings():
     return settings
 
 def get_api_key():
-    settings = get_settings()
-    return settings.get('tmdb_api_key')
+    return _load_settings().get('tmdb_api_key')
 
 def prompt_for_api_key():
+    if _headless:
+        logger.error("TMDb API key is not set; set tmdb_api_key in %s or %s", SETTINGS_FILE, env_var_name('tmdb_api_key'))
+        return None
     api_key = input("Enter your TMDb API key: ")
-    settings = get_settings()
+    # Only the file's own contents are written back; get_settings() also holds the environment
+    # overrides, and secrets passed as PLEX_SYMLINK_* must not end up on disk
+    try:
+        with open(SETTINGS_FILE, "r") as f:
+            settings = json.load(f)
+    except FileNotFoundError:
+        settings = {}
+    except (IOError, json.JSONDecodeError) as e:
+        logger.error("Not saving the TMDb API key, %s is unreadable: %s", SETTINGS_FILE, e)
+        return api_key
     settings['tmdb_api_key'] = api_key
     save_settings(settings)
     return api_key
 
 def get_overseer_settings():
-    settings = get_settings()
+    settings = _load_settings()
     return settings.get('overseer_api_address'), settings.get('overseer_api_key')
@@ -1,13 +1,22 @@
 import sqlite3
-from collections import defaultdict
+from trigram import TrigramIndex, generate_ngrams
 import re
 import json
+import gzip
+import os
+import time
 
 DB_FILE = 'symlinks.db'
 
+# Failed folders are retried after 1 minute, then 2, 4, ... capped at a day
+RETRY_BACKOFF_BASE = 60
+RETRY_BACKOFF_MAX = 24 * 60 * 60
+
 def initialize_db():
     conn = sqlite3.connect(DB_FILE)
     cursor = conn.cursor()
+    # Several library scanners share the DB; WAL lets them read while one writes
+    cursor.execute('''PRAGMA journal_mode=WAL''')
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS MediaItems (
             id INTEGER PRIMARY KEY,
@@ -17,6 +26,7 @@ def initialize_db():
             deprecated INTEGER DEFAULT 0
         )
     ''')
+    cursor.execute('''CREATE INDEX IF NOT EXISTS idx_mediaitems_symlink ON MediaItems (symlink)''')
     cursor.execute('''CREATE TABLE IF NOT EXISTS ProcessedFolders (
                         id INTEGER PRIMARY KEY,
                         folder_name TEXT UNIQUE,
@@ -26,7 +36,13 @@ def initialize_db():
                         original_name TEXT,
                         possible_matches TEXT,
                         solution TEXT,
-                        folder_paths TEXT)''')
+                        folder_paths TEXT,
+                        folder_path TEXT,
+                        attempts INTEGER DEFAULT 0,
+                        next_retry REAL DEFAULT 0)''')
+    migrate_multiple_matches(cursor)
+    cursor.execute('''CREATE UNIQUE INDEX IF NOT EXISTS idx_multiplematches_folder
+                      ON MultipleMatches (folder_path)''')
     cursor.execute('''CREATE TABLE IF NOT EXISTS WrongPattern (
                         id INTEGER PRIMARY KEY,
                         filename TEXT)''')
@@ -34,9 +50,74 @@ def initialize_db():
                         tmdb_id INTEGER PRIMARY KEY,
                         series_name TEXT,
                         year INTEGER)''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS TmdbSearchCache (
+                        query TEXT PRIMARY KEY,
+                        results TEXT,
+                        fetched_at REAL)''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS TmdbSeasons (
+                        tmdb_id INTEGER,
+                        season INTEGER,
+                        episodes TEXT,
+                        fetched_at REAL,
+                        PRIMARY KEY (tmdb_id, season))''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS TmdbCatalog (
+                        tmdb_id INTEGER PRIMARY KEY,
+                        series_name TEXT NOT NULL,
+                        year INTEGER,
+                        popularity REAL)''')
+    cursor.execute('''CREATE INDEX IF NOT EXISTS idx_tmdbcatalog_name
+                      ON TmdbCatalog (series_name COLLATE NOCASE)''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS EpisodeSources (
+                        episode_key TEXT NOT NULL,
+                        src_file TEXT NOT NULL,
+                        symlink TEXT,
+                        resolution_rank INTEGER,
+                        size INTEGER,
+                        codec_rank INTEGER,
+                        selected INTEGER DEFAULT 0,
+                        PRIMARY KEY (episode_key, src_file))''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS LinkJournal (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        folder TEXT NOT NULL,
+                        action TEXT NOT NULL,
+                        src_file TEXT,
+                        symlink TEXT,
+                        tmdb_id TEXT,
+                        record INTEGER DEFAULT 0)''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS ShowAliases (
+                        stem TEXT PRIMARY KEY,
+                        show_folder TEXT NOT NULL,
+                        source TEXT,
+                        updated_at REAL)''')
     conn.commit()
     conn.close()
 
+def migrate_multiple_matches(cursor):
+    """Collapse the old one-row-per-failure MultipleMatches layout into one row per folder."""
+    columns = {row[1] for row in cursor.execute('''PRAGMA table_info(MultipleMatches)''')}
+    if 'folder_path' in columns:
+        return
+    cursor.execute('''ALTER TABLE MultipleMatches ADD COLUMN folder_path TEXT''')
+    cursor.execute('''ALTER TABLE MultipleMatches ADD COLUMN attempts INTEGER DEFAULT 0''')
+    cursor.execute('''ALTER TABLE MultipleMatches ADD COLUMN next_retry REAL DEFAULT 0''')
+    cursor.execute('''SELECT id, solution, folder_paths FROM MultipleMatches ORDER BY id DESC''')
+    kept = {}
+    for id, solution, folder_paths in cursor.fetchall():
+        try:
+            folder_path = (json.loads(folder_paths) or [None])[0] if folder_paths else None
+        except json.JSONDecodeError:
+            folder_path = None
+        if folder_path not in kept:
+            kept[folder_path] = [id, solution, 1]
+            cursor.execute('''UPDATE MultipleMatches SET folder_path = ? WHERE id = ?''', (folder_path, id))
+        else:
+            row = kept[folder_path]
+            row[1] = row[1] or solution
+            row[2] += 1
+            cursor.execute('''DELETE FROM MultipleMatches WHERE id = ?''', (id,))
+    for id, solution, attempts in kept.values():
+        cursor.execute('''UPDATE MultipleMatches SET solution = ?, attempts = ? WHERE id = ?''', (solution, attempts, id))
+
 def log_media_item(src_dir, symlink, tmdb_id=None):
     conn = sqlite3.connect(DB_FILE)
     cursor = conn.cursor()
@@ -50,14 +131,46 @@ def log_media_item(src_dir, symlink, tmdb_id=None):
     conn.commit()
     conn.close()
 
+def log_media_items(items):
+    if not items:
+        return
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    cursor.executemany('''
+        INSERT INTO MediaItems (src_dir, symlink, tmdb_id)
+        VALUES (?, ?, ?)
+        ON CONFLICT(src_dir) DO UPDATE SET
+        symlink=excluded.symlink,
+        tmdb_id=excluded.tmdb_id
+    ''', items)
+    conn.commit()
+    conn.close()
+
+def iter_media_items(batch_size=1000):
+    conn = sqlite3.connect(DB_FILE)
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''SELECT src_dir, symlink FROM MediaItems WHERE deprecated = 0 ORDER BY id''')
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        conn.close()
+
+def like_prefix(path):
+    """A LIKE pattern matching path as a literal prefix; '_' and '%' are common in torrent names."""
+    return re.sub(r'([\\%_])', r'\\\1', path) + '%'
+
 def mark_folder_deprecated(folder_path):
     conn = sqlite3.connect(DB_FILE)
     cursor = conn.cursor()
     cursor.execute('''
         UPDATE MediaItems
         SET deprecated = 1
-        WHERE src_dir LIKE ?
-    ''', (f"{folder_path}%",))
+        WHERE src_dir LIKE ? ESCAPE '\\'
+    ''', (like_prefix(folder_path),))
     conn.commit()
     conn.close()
 
@@ -67,8 +180,8 @@ def mark_folder_active(folder_path):
     cursor.execute('''
         UPDATE MediaItems
         SET deprecated = 0
-        WHERE src_dir LIKE ?
-    ''', (f"{folder_path}%",))
+        WHERE src_dir LIKE ? ESCAPE '\\'
+    ''', (like_prefix(folder_path),))
     conn.commit()
     conn.close()
 
@@ -99,8 +212,19 @@ def log_multiple_match(original_name, possible_matches, folder_path):
     cursor = conn.cursor()
     possible_matches_json = json.dumps(possible_matches)
     folder_paths_json = json.dumps([folder_path])
-    cursor.execute('''INSERT INTO MultipleMatches (original_name, possible_matches, folder_paths)
-                      VALUES (?, ?, ?)''', (original_name, possible_matches_json, folder_paths_json))
+    cursor.execute('''SELECT attempts FROM MultipleMatches WHERE folder_path = ?''', (folder_path,))
+    row = cursor.fetchone()
+    attempts = (row[0] or 0) + 1 if row else 1
+    next_retry = time.time() + min(RETRY_BACKOFF_BASE * 2 ** (attempts - 1), RETRY_BACKOFF_MAX)
+    cursor.execute('''
+        INSERT INTO MultipleMatches (original_name, possible_matches, folder_paths, folder_path, attempts, next_retry)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(folder_path) DO UPDATE SET
+        original_name=excluded.original_name,
+        possible_matches=excluded.possible_matches,
+        attempts=excluded.attempts,
+        next_retry=excluded.next_retry
+    ''', (original_name, possible_matches_json, folder_paths_json, folder_path, attempts, next_retry))
     conn.commit()
     conn.close()
 
@@ -132,35 +256,114 @@ def get_multiple_matches():
 def get_unresolved_multiple_matches():
     conn = sqlite3.connect(DB_FILE)
     cursor = conn.cursor()
-    cursor.execute('''SELECT id, original_name, possible_matches, folder_paths 
-                      FROM MultipleMatches WHERE solution IS NULL''')
+    # One entry per folder; possible_matches comes from the folder's latest attempt
+    cursor.execute('''SELECT folder_path, GROUP_CONCAT(DISTINCT original_name), possible_matches, MAX(id)
+                      FROM MultipleMatches
+                      WHERE solution IS NULL AND folder_path IS NOT NULL
+                      GROUP BY folder_path
+                      ORDER BY MAX(id)''')
     unresolved_matches = cursor.fetchall()
     conn.close()
     matches = []
-    for row in unresolved_matches:
-        id, original_name, possible_matches, folder_paths = row
+    for folder_path, original_names, possible_matches, _ in unresolved_matches:
         try:
             possible_matches = json.loads(possible_matches)
-        except json.JSONDecodeError:
+        except (TypeError, json.JSONDecodeError):
             possible_matches = []
-        try:
-            folder_paths = json.loads(folder_paths) if folder_paths else []
-        except json.JSONDecodeError:
-            folder_paths = []
-        matches.append((id, original_name, possible_matches, folder_paths))
+        matches.append((folder_path, original_names or '', possible_matches))
     return matches
 
-def update_multiple_match_solution(id, solution):
+def get_resolved_multiple_matches():
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    cursor.execute('''SELECT folder_path, solution FROM MultipleMatches
+                      WHERE solution IS NOT NULL AND folder_path IS NOT NULL''')
+    resolved_matches = cursor.fetchall()
+    conn.close()
+    return resolved_matches
+
+def get_multiple_match_retry_times():
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    cursor.execute('''SELECT folder_path, next_retry FROM MultipleMatches
+                      WHERE solution IS NULL AND folder_path IS NOT NULL''')
+    retry_times = {row[0]: row[1] or 0 for row in cursor.fetchall()}
+    conn.close()
+    return retry_times
+
+def update_multiple_match_solution(folder_path, solution):
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    cursor.execute('''UPDATE MultipleMatches SET solution = ? WHERE folder_path = ?''', (solution, folder_path))
+    conn.commit()
+    conn.close()
+
+def delete_multiple_match(folder_path):
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    cursor.execute('''DELETE FROM MultipleMatches WHERE folder_path = ?''', (folder_path,))
+    conn.commit()
+    conn.close()
+
+def get_selected_episode_sources(episode_keys):
+    """Return {episode_key: (src_file, symlink, quality)} for the source currently linked for each episode."""
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    episode_keys = list(episode_keys)
+    selected = {}
+    # Stay under SQLite's bound parameter limit
+    for start in range(0, len(episode_keys), 500):
+        chunk = episode_keys[start:start + 500]
+        cursor.execute(f'''SELECT episode_key, src_file, symlink, resolution_rank, size, codec_rank
+                           FROM EpisodeSources WHERE selected = 1
+                           AND episode_key IN ({','.join('?' * len(chunk))})''', chunk)
+        for episode_key, src_file, symlink, resolution_rank, size, codec_rank in cursor.fetchall():
+            selected[episode_key] = (src_file, symlink, (resolution_rank, size, codec_rank))
+    conn.close()
+    return selected
+
+def log_episode_sources(candidates, selected):
+    """Record every candidate (episode_key, src_file, symlink, quality) and mark the selected source per episode."""
+    if not candidates:
+        return
     conn = sqlite3.connect(DB_FILE)
     cursor = conn.cursor()
-    cursor.execute('''UPDATE MultipleMatches SET solution = ? WHERE id = ?''', (solution, id))
+    cursor.executemany('''
+        INSERT INTO EpisodeSources (episode_key, src_file, symlink, resolution_rank, size, codec_rank)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(episode_key, src_file) DO UPDATE SET
+        symlink=excluded.symlink,
+        resolution_rank=excluded.resolution_rank,
+        size=excluded.size,
+        codec_rank=excluded.codec_rank
+    ''', [(episode_key, src_file, symlink) + tuple(quality) for episode_key, src_file, symlink, quality in candidates])
+    cursor.executemany('''UPDATE EpisodeSources SET selected = (src_file = ?) WHERE episode_key = ?''',
+                       [(src_file, episode_key) for episode_key, src_file in selected.items()])
     conn.commit()
     conn.close()
 
-def delete_multiple_match(id):
+def get_show_aliases():
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    cursor.execute('''SELECT stem, show_folder FROM ShowAliases''')
+    aliases = {row[0]: row[1] for row in cursor.fetchall()}
+    conn.close()
+    return aliases
+
+def store_show_aliases(stems, show_folder, source):
+    """Point every stem at show_folder; a manual resolution is never overwritten by an automatic match."""
     conn = sqlite3.connect(DB_FILE)
     cursor = conn.cursor()
-    cursor.execute('''DELETE FROM MultipleMatches WHERE id = ?''', (id,))
+    now = time.time()
+    cursor.executemany('''
+        INSERT INTO ShowAliases (stem, show_folder, source, updated_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(stem) DO UPDATE SET
+        show_folder=excluded.show_folder,
+        source=excluded.source,
+        updated_at=excluded.updated_at
+        WHERE ShowAliases.source != 'manual' OR excluded.source = 'manual'
+    ''', [(stem, show_folder, source, now) for stem in stems if stem])
     conn.commit()
     conn.close()
 
@@ -193,46 +396,184 @@ def get_tmdb_series_name(tmdb_id):
     conn.close()
     return result if result else (None, None)
 
+def get_cached_tmdb_search(query, max_age):
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    # Empty results stored by older versions are treated as a miss
+    cursor.execute('''SELECT results FROM TmdbSearchCache WHERE query = ? AND fetched_at > ? AND results != ?''',
+                   (query, time.time() - max_age, '[]'))
+    row = cursor.fetchone()
+    conn.close()
+    return json.loads(row[0]) if row else None
+
+def store_tmdb_search(query, results):
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO TmdbSearchCache (query, results, fetched_at)
+        VALUES (?, ?, ?)
+        ON CONFLICT(query) DO UPDATE SET
+        results=excluded.results,
+        fetched_at=excluded.fetched_at
+    ''', (query, json.dumps(results), time.time()))
+    conn.commit()
+    conn.close()
+
+def get_cached_tmdb_seasons(keys, max_age):
+    """{(tmdb_id, season): {episode number: title}} for the cached seasons among keys younger than max_age."""
+    keys = list(keys)
+    seasons = {}
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    for start in range(0, len(keys), 250):
+        chunk = keys[start:start + 250]
+        conditions = ' OR '.join(['(tmdb_id = ? AND season = ?)'] * len(chunk))
+        cursor.execute(f'''SELECT tmdb_id, season, episodes FROM TmdbSeasons
+                           WHERE fetched_at > ? AND ({conditions})''',
+                       [time.time() - max_age] + [value for key in chunk for value in key])
+        for tmdb_id, season, episodes in cursor.fetchall():
+            seasons[(tmdb_id, season)] = {int(number): title for number, title in json.loads(episodes).items()}
+    conn.close()
+    return seasons
+
+def store_tmdb_seasons(seasons):
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    now = time.time()
+    cursor.executemany('''
+        INSERT INTO TmdbSeasons (tmdb_id, season, episodes, fetched_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(tmdb_id, season) DO UPDATE SET
+        episodes=excluded.episodes,
+        fetched_at=excluded.fetched_at
+    ''', [(tmdb_id, season, json.dumps(episodes), now) for (tmdb_id, season), episodes in seasons.items()])
+    conn.commit()
+    conn.close()
+
+STATS_QUERIES = [
+    ('Linked files', 'SELECT COUNT(*) FROM MediaItems'),
+    ('Processed folders', "SELECT COUNT(*) FROM ProcessedFolders WHERE status = 'processed'"),
+    ('Unmatched folders', 'SELECT COUNT(DISTINCT folder_path) FROM MultipleMatches WHERE solution IS NULL'),
+    ('Resolved, waiting to link', 'SELECT COUNT(DISTINCT folder_path) FROM MultipleMatches WHERE solution IS NOT NULL'),
+    ('Journalled operations', 'SELECT COUNT(*) FROM LinkJournal'),
+    ('Show aliases', 'SELECT COUNT(*) FROM ShowAliases'),
+    ('Episodes with several sources', 'SELECT COUNT(*) FROM (SELECT episode_key FROM EpisodeSources GROUP BY episode_key HAVING COUNT(*) > 1)'),
+    ('TMDb series names', 'SELECT COUNT(*) FROM TmdbSeriesNames'),
+    ('TMDb catalog entries', 'SELECT COUNT(*) FROM TmdbCatalog'),
+    ('Cached TMDb searches', 'SELECT COUNT(*) FROM TmdbSearchCache'),
+    ('Cached TMDb seasons', 'SELECT COUNT(*) FROM TmdbSeasons'),
+]
+
+def get_stats():
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    stats = [(label, cursor.execute(query).fetchone()[0]) for label, query in STATS_QUERIES]
+    conn.close()
+    return stats
+
+def get_all_tmdb_series_names():
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    cursor.execute('''SELECT tmdb_id, series_name, year FROM TmdbSeriesNames''')
+    series = cursor.fetchall()
+    conn.close()
+    return series
+
 def build_inverted_index():
     conn = sqlite3.connect(DB_FILE)
     cursor = conn.cursor()
     cursor.execute('''SELECT tmdb_id, series_name, year FROM TmdbSeriesNames''')
     series = cursor.fetchall()
     conn.close()
-    
-    inverted_index = defaultdict(list)
-    
-    for tmdb_id, series_name, year in series:
-        ngrams = generate_ngrams(series_name)
-        for ngram in ngrams:
-            inverted_index[ngram].append((series_name, tmdb_id, year))
-    
-    return inverted_index
-
-def generate_ngrams(text, n=3):
-    text = text.lower()
-    text = re.sub(r'[^a-z0-9\s.]', '', text)  # Keep periods
-    words = text.split()
-    ngrams = set()
-    for word in words:
-        for i in range(len(word) - n + 1):
-            ngrams.add(word[i:i+n])
-    return ngrams
-
-
-def search_inverted_index(query, inverted_index, year=None):
-    query = re.sub(r'[^a-z0-9\s.]', '', query.lower())  # Normalize query with periods
-    query_ngrams = generate_ngrams(query)
-    results = defaultdict(int)
+    return index_series(series)
 
-    for ngram in query_ngrams:
-        if ngram in inverted_index:
-            for series_name, tmdb_id, series_year in inverted_index[ngram]:
-                if year is None or series_year == year:
-                    results[(series_name, tmdb_id, series_year)] += 1
+def build_catalog_index():
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    cursor.execute('''SELECT tmdb_id, series_name, year FROM TmdbCatalog''')
+    series = cursor.fetchall()
+    conn.close()
+    return index_series(series)
+
+def index_series(series):
+    return TrigramIndex(series)
+
+def import_tmdb_catalog(export_path, batch_size=10000):
+    """Load a TMDb daily ID export (tv_series_ids_MM_DD_YYYY.json.gz) into TmdbCatalog."""
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    imported = 0
+    batch = []
+
+    def flush():
+        cursor.executemany('''
+            INSERT INTO TmdbCatalog (tmdb_id, series_name, year, popularity)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(tmdb_id) DO UPDATE SET
+            series_name=excluded.series_name,
+            year=COALESCE(excluded.year, TmdbCatalog.year),
+            popularity=excluded.popularity
+        ''', batch)
+        batch.clear()
+
+    with gzip.open(export_path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if entry.get('adult') or not entry.get('id') or not entry.get('original_name'):
+                continue
+            # The ID exports carry no air date; keep one if a richer dump provides it
+            first_air_date = entry.get('first_air_date')
+            year = int(first_air_date[:4]) if first_air_date else None
+            batch.append((entry['id'], entry['original_name'], year, entry.get('popularity')))
+            imported += 1
+            if len(batch) >= batch_size:
+                flush()
+    if batch:
+        flush()
+    conn.commit()
+    conn.close()
+    return imported
 
-    sorted_results = sorted(results.items(), key=lambda item: item[1], reverse=True)
-    return sorted_results
+def get_tmdb_series_count():
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    cursor.execute('''SELECT COUNT(*) FROM TmdbSeriesNames''')
+    count = cursor.fetchone()[0]
+    conn.close()
+    return count
+
+def get_tmdb_catalog_count():
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    cursor.execute('''SELECT COUNT(*) FROM TmdbCatalog''')
+    count = cursor.fetchone()[0]
+    conn.close()
+    return count
+
+def find_tmdb_catalog_exact(series_name):
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    cursor.execute('''SELECT tmdb_id, series_name, year FROM TmdbCatalog
+                      WHERE series_name = ? COLLATE NOCASE
+                      ORDER BY popularity DESC''', (series_name,))
+    results = cursor.fetchall()
+    conn.close()
+    return results
+
+def set_tmdb_catalog_year(tmdb_id, year):
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    cursor.execute('''UPDATE TmdbCatalog SET year = ? WHERE tmdb_id = ?''', (year, tmdb_id))
+    conn.commit()
+    conn.close()
+
+def search_inverted_index(query, inverted_index, year=None, year_tolerance=0, limit=None):
+    query = re.sub(r'[^a-z0-9\s.]', '', query.lower())  # Normalize query with periods
+    # Highest ngram overlap wins; ties go to the title closest to the requested year
+    return inverted_index.search(query, year, year_tolerance, limit) if inverted_index else []
 
 
 # Example usage
@@ -0,0 +1,94 @@
+import re
+from collections import namedtuple
+
+Episode = namedtuple('Episode', 'prefix kind season episodes air_date')
+
+# Tried left to right in a single scan; the leftmost hit wins, ties go to the earlier row
+EPISODE_PATTERNS = [
+    # S01E01, S01 E01, S01E01E02, S01E01-E03, S01E01-03
+    ('standard', r'S(?P<std_season>\d{1,2}) ?E(?P<std_episode>\d{2,3})(?P<std_more>(?:-?E\d{2,3}|-\d{2,3}(?![\dp]))*)'),
+    # 1x01, 1x01-1x03, 1x01-03; not audio channels glued to a codec, as in DD5.1x264 or AAC2.0x265
+    ('cross', r'(?<!\d\.)(?P<x_season>\d{1,2})x(?!26[45](?!\d))(?P<x_episode>\d{2,3})(?:-(?:\d{1,2}x)?(?P<x_last>\d{2,3}))?(?![\dp])'),
+    # 2024.01.15, 2024-01-15, 2024 01 15
+    ('daily', r'(?P<year>(?:19|20)\d{2})[. _-](?P<month>0[1-9]|1[0-2])[. _-](?P<day>0[1-9]|[12]\d|3[01])(?!\d)'),
+]
+
+EPISODE_REGEX = re.compile(
+    r'(?<![A-Za-z0-9])(?:' + '|'.join(f'(?P<{kind}>{pattern})' for kind, pattern in EPISODE_PATTERNS) + ')',
+    re.IGNORECASE,
+)
+
+# Fansub style absolute numbering: "[Group] Show - 1071 [1080p].mkv", "Show - 12v2.mkv"
+ABSOLUTE_REGEX = re.compile(r' - (?P<absolute>\d{1,4})(?:v\d)?(?=[ .\[(]|$)')
+
+MORE_EPISODES_REGEX = re.compile(r'\d{2,3}')
+
+RELEASE_GROUP_REGEX = re.compile(r'^\s*\[[^\]]*\]\s*')
+
+
+def parse_episode(filename):
+    """Recognise the episode numbering in a file name, or return None for non-episode files."""
+    match = EPISODE_REGEX.search(filename)
+    if match:
+        prefix = filename[:match.start()]
+        if match.group('standard'):
+            episodes = [int(match.group('std_episode'))]
+            for number in MORE_EPISODES_REGEX.findall(match.group('std_more') or ''):
+                episodes.append(int(number))
+            return Episode(prefix, 'standard', int(match.group('std_season')), expand_range(episodes), None)
+        if match.group('cross'):
+            episodes = [int(match.group('x_episode'))]
+            if match.group('x_last'):
+                episodes.append(int(match.group('x_last')))
+            return Episode(prefix, 'standard', int(match.group('x_season')), expand_range(episodes), None)
+        air_date = f"{match.group('year')}-{match.group('month')}-{match.group('day')}"
+        return Episode(prefix, 'daily', int(match.group('year')), [], air_date)
+
+    stem = filename.rsplit('.', 1)[0]
+    match = ABSOLUTE_REGEX.search(stem)
+    if match:
+        number = int(match.group('absolute'))
+        # A bare year after the dash is a title, not an episode number
+        if not 1900 <= number <= 2099:
+            return Episode(stem[:match.start()], 'absolute', None, [number], None)
+    return None
+
+
+def episode_show_name(episode, folder_name):
+    """Show name from the text before the episode number, or from the folder when the file starts with it."""
+    prefix = RELEASE_GROUP_REGEX.sub('', episode.prefix).strip(' .-_')
+    if not prefix:
+        return re.sub(r'\s*(S\d{2}.*|Season \d+).*', '', folder_name).replace('-', ' ').replace('.', ' ').strip()
+    return prefix.replace('.', ' ').strip()
+
+
+def expand_range(episodes):
+    """S01E01-E03 names the first and last episode; fill in the ones between."""
+    if len(episodes) == 2 and episodes[1] > episodes[0] + 1:
+        return list(range(episodes[0], episodes[1] + 1))
+    return sorted(set(episodes))
+
+
+def episode_identifier(episode):
+    """Plex naming for the episode part: S01E02, S01E01-E03 or 2024-01-15."""
+    if episode.kind == 'daily':
+        return episode.air_date
+    season = episode.season if episode.season is not None else 1
+    identifier = f"S{season:02d}E{episode.episodes[0]:02d}"
+    if len(episode.episodes) > 1:
+        identifier += f"-E{episode.episodes[-1]:02d}"
+    return identifier
+
+
+def parse_identifier(identifier):
+    """(season, first episode) from an S01E02 style identifier; None for dates."""
+    match = re.match(r'S(\d+)E(\d+)', identifier or '')
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+
+def season_folder(episode):
+    if episode.kind == 'daily':
+        return f"Season {episode.season}"
+    # Absolute numbering goes in Season 1, matching Plex's absolute episode ordering
+    return f"Season {episode.season if episode.season is not None else 1}"
+
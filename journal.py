@@ -0,0 +1,156 @@
+import logging
+import os
+import shutil
+import sqlite3
+from collections import OrderedDict
+from config import relative_links_for
+from db import DB_FILE
+from linkwriter import LinkWriter
+
+logger = logging.getLogger(__name__)
+
+# link: create if missing, replace: swap out a link to another source, copytree: copy a source
+# directory, unlink: remove a link if it still points at src_file, processed: mark a folder done
+ACTIONS = ('link', 'replace', 'copytree', 'unlink', 'processed')
+
+
+def record_operations(folder, operations):
+    """Append the intended mutations for one folder before any of them touch the filesystem.
+
+    operations are (action, src_file, symlink, tmdb_id, record) tuples; record marks the links
+    that belong in MediaItems.
+    """
+    if not operations:
+        return
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    cursor.executemany('''INSERT INTO LinkJournal (folder, action, src_file, symlink, tmdb_id, record)
+                          VALUES (?, ?, ?, ?, ?, ?)''',
+                       [(folder,) + tuple(operation) for operation in operations])
+    conn.commit()
+    conn.close()
+
+
+def apply_operations(writer, operations, failed=None):
+    """Carry out journalled operations; every step is idempotent so a replay can repeat it.
+
+    Returns how many links were created or removed. An operation the filesystem refuses (say, a file
+    sitting where a show directory belongs) is logged and appended to failed instead of stopping the rest.
+    """
+    changed = 0
+    for operation in operations:
+        try:
+            changed += apply_operation(writer, *operation[:3])
+        except OSError as e:
+            logger.error("Could not %s %s: %s", operation[0], operation[2], e)
+            if failed is not None:
+                failed.append(operation)
+    return changed
+
+
+def apply_operation(writer, action, src_file, symlink):
+    if action == 'link':
+        if writer.link(src_file, symlink):
+            logger.debug("Created symlink: %s -> %s", symlink, src_file)
+            return 1
+    elif action == 'replace':
+        if writer.link(src_file, symlink, replace=True):
+            logger.debug("Created symlink: %s -> %s", symlink, src_file)
+            return 1
+    elif action == 'copytree':
+        writer.ensure_dir(os.path.dirname(symlink))
+        existing_target = writer.read_link(symlink)
+        if existing_target is False or writer.points_to(existing_target, src_file, symlink):
+            return 0
+        if existing_target is not None:
+            writer.remove(symlink)
+        shutil.copytree(src_file, symlink, symlinks=True)
+        logger.debug("Copied tree: %s -> %s", symlink, src_file)
+        return 1
+    elif action == 'unlink':
+        if writer.points_to(writer.read_link(symlink), src_file, symlink):
+            writer.remove(symlink)
+            logger.debug("Removed symlink: %s", symlink)
+            return 1
+    return 0
+
+
+def commit_operations(folder, failed=()):
+    """Make the DB agree with the applied operations and drop them from the journal, atomically.
+
+    Failed operations are left out of MediaItems, and their folder isn't marked processed so the
+    next scan tries it again.
+    """
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    cursor.executemany('''DELETE FROM LinkJournal WHERE folder = ? AND action = ? AND src_file IS ? AND symlink IS ?''',
+                       [(folder,) + tuple(operation[:3]) for operation in failed])
+    if failed:
+        cursor.execute('''DELETE FROM LinkJournal WHERE folder = ? AND action = 'processed' ''', (folder,))
+    cursor.execute('''DELETE FROM MediaItems WHERE symlink IN
+                      (SELECT symlink FROM LinkJournal WHERE folder = ? AND action = 'unlink')''', (folder,))
+    cursor.execute('''
+        INSERT INTO MediaItems (src_dir, symlink, tmdb_id)
+        SELECT src_file, symlink, tmdb_id FROM LinkJournal WHERE folder = ? AND record = 1 ORDER BY id
+        ON CONFLICT(src_dir) DO UPDATE SET
+        symlink=excluded.symlink,
+        tmdb_id=excluded.tmdb_id,
+        deprecated=0
+    ''', (folder,))
+    cursor.execute('''INSERT OR IGNORE INTO ProcessedFolders (folder_name, status)
+                      SELECT symlink, 'processed' FROM LinkJournal WHERE folder = ? AND action = 'processed' ''', (folder,))
+    cursor.execute('''UPDATE ProcessedFolders SET status = 'processed' WHERE folder_name IN
+                      (SELECT symlink FROM LinkJournal WHERE folder = ? AND action = 'processed')''', (folder,))
+    cursor.execute('''DELETE FROM LinkJournal WHERE folder = ?''', (folder,))
+    conn.commit()
+    conn.close()
+
+
+def discard_operations(folder):
+    conn = sqlite3.connect(DB_FILE)
+    conn.execute('''DELETE FROM LinkJournal WHERE folder = ?''', (folder,))
+    conn.commit()
+    conn.close()
+
+
+def run_operations(writer, folder, operations):
+    record_operations(folder, operations)
+    failed = []
+    changed = apply_operations(writer, operations, failed)
+    commit_operations(folder, failed)
+    return changed
+
+
+def replay_journal(libraries=None, relative_links=False):
+    """Finish whatever a previous run journalled but never committed; returns the number of folders replayed.
+
+    Committed work is deleted from the journal, so this reads only the in-flight tail. Links are written
+    in the form the folder's library uses; relative_links applies to folders outside every library.
+    A folder whose entries can't be replayed is dropped from the journal (it was never marked
+    processed, so the next scan links it again) rather than failing every start.
+    """
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    cursor.execute('''SELECT folder, action, src_file, symlink, tmdb_id, record FROM LinkJournal ORDER BY id''')
+    pending = OrderedDict()
+    for folder, *operation in cursor.fetchall():
+        pending.setdefault(folder, []).append(operation)
+    conn.close()
+
+    if not pending:
+        return 0
+    logger.info("Replaying journalled operations for %d folder(s)", len(pending))
+    writers = {relative: LinkWriter(relative=relative) for relative in (False, True)}
+    try:
+        for folder, operations in pending.items():
+            try:
+                failed = []
+                apply_operations(writers[relative_links_for(folder, libraries, relative_links)], operations, failed)
+                commit_operations(folder, failed)
+            except Exception:
+                logger.exception("Discarding journalled operations for %s", folder)
+                discard_operations(folder)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return len(pending)
@@ -0,0 +1,122 @@
+import os
+from collections import OrderedDict
+
+
+class LinkWriter:
+    """Creates library symlinks, remembering which directories exist and keeping them open.
+
+    Links are made relative to their parent directory file descriptor, so a deep library path is
+    resolved once per directory instead of once per syscall. With relative=True the stored link
+    target is relative to the link's own directory, which keeps the library valid when the whole
+    tree is moved or bind-mounted somewhere else.
+    """
+
+    def __init__(self, relative=False, max_open_dirs=256):
+        self.relative = relative
+        self.max_open_dirs = max_open_dirs
+        self.created_dirs = set()
+        self.dir_fds = OrderedDict()
+        self.use_dir_fd = os.symlink in os.supports_dir_fd and os.readlink in os.supports_dir_fd
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        for fd in self.dir_fds.values():
+            os.close(fd)
+        self.dir_fds.clear()
+
+    def ensure_dir(self, path):
+        if path not in self.created_dirs:
+            os.makedirs(path, exist_ok=True)
+            self.created_dirs.add(path)
+
+    def dir_fd(self, path):
+        fd = self.dir_fds.get(path)
+        if fd is not None:
+            self.dir_fds.move_to_end(path)
+            return fd
+        fd = os.open(path, os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0))
+        self.dir_fds[path] = fd
+        if len(self.dir_fds) > self.max_open_dirs:
+            _, oldest = self.dir_fds.popitem(last=False)
+            os.close(oldest)
+        return fd
+
+    def target_for(self, src_file, dest_file):
+        if self.relative:
+            return os.path.relpath(src_file, os.path.dirname(dest_file))
+        return src_file
+
+    def read_link(self, dest_file):
+        """Return the symlink target at dest_file, None if nothing is there, or False if a real file is in the way."""
+        parent, name = os.path.split(dest_file)
+        try:
+            if self.use_dir_fd and parent in self.created_dirs:
+                return os.readlink(name, dir_fd=self.dir_fd(parent))
+            return os.readlink(dest_file)
+        except FileNotFoundError:
+            return None
+        except OSError:
+            return False
+
+    def points_to(self, target, src_file, dest_file):
+        if not target:
+            return False
+        if not os.path.isabs(target):
+            target = os.path.normpath(os.path.join(os.path.dirname(dest_file), target))
+        return target == src_file
+
+    def symlink(self, target, dest_file):
+        parent, name = os.path.split(dest_file)
+        if self.use_dir_fd:
+            os.symlink(target, name, dir_fd=self.dir_fd(parent))
+        else:
+            os.symlink(target, dest_file)
+
+    def remove(self, dest_file):
+        parent, name = os.path.split(dest_file)
+        if self.use_dir_fd:
+            os.unlink(name, dir_fd=self.dir_fd(parent))
+        else:
+            os.remove(dest_file)
+
+    def link(self, src_file, dest_file, replace=False):
+        """Link dest_file to src_file; returns True if a link was written.
+
+        An existing link to another source is only swapped out when replace is set, and a
+        regular file or directory at dest_file is never touched.
+        """
+        self.ensure_dir(os.path.dirname(dest_file))
+        existing_target = self.read_link(dest_file)
+        if existing_target is False:
+            return False
+        if existing_target is not None:
+            if not replace or self.points_to(existing_target, src_file, dest_file):
+                return False
+            self.remove(dest_file)
+        self.symlink(self.target_for(src_file, dest_file), dest_file)
+        return True
+
+    def relink(self, src_file, dest_file):
+        """Rewrite an existing link in the configured absolute/relative form, atomically."""
+        existing_target = self.read_link(dest_file)
+        if not existing_target or not self.points_to(existing_target, src_file, dest_file):
+            return False
+        target = self.target_for(src_file, dest_file)
+        if existing_target == target:
+            return False
+        parent, name = os.path.split(dest_file)
+        temp_name = f".{name}.relink"
+        if self.use_dir_fd:
+            fd = self.dir_fd(parent)
+            os.symlink(target, temp_name, dir_fd=fd)
+            os.replace(temp_name, name, src_dir_fd=fd, dst_dir_fd=fd)
+        else:
+            temp_file = os.path.join(parent, temp_name)
+            os.symlink(target, temp_file)
+            os.replace(temp_file, dest_file)
+        return True
@@ -0,0 +1,130 @@
+import atexit
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+logger = logging.getLogger(__name__)
+
+LOG_FORMATS = ('text', 'json')
+
+_listener = None
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)-7s %(message)s', '%Y-%m-%d %H:%M:%S')
+
+    def format(self, record):
+        line = super().format(record)
+        if getattr(record, 'suppressed', 0):
+            line += f" ({record.suppressed} similar messages suppressed)"
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; fields passed as extra={'fields': {...}} become top-level keys."""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        if getattr(record, 'suppressed', 0):
+            entry['suppressed'] = record.suppressed
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """Let at most `burst` DEBUG records of one message template through per `interval` seconds.
+
+    Only the per-file DEBUG events are limited; folder summaries, warnings and errors always pass.
+    The first record let through after a quiet spell carries the number dropped in between, so a
+    burst of per-file messages turns into a count instead of vanishing.
+    """
+
+    def __init__(self, burst=50, interval=10.0, clock=time.monotonic):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.clock = clock
+        self.windows = {}  # (logger, template) -> [window start, passed, suppressed]
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        now = self.clock()
+        with self.lock:
+            window = self.windows.get((record.name, record.msg))
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                self.windows[(record.name, record.msg)] = [now, 1, 0]
+                record.suppressed = suppressed
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+
+class DeferredQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # Message arguments are formatted by the writer thread, not the caller
+        return record
+
+
+def setup_logging(level='INFO', fmt='text', stream=None, burst=50, interval=10.0):
+    """Route every logger through an in-memory queue drained by a background writer thread.
+
+    The scanning threads only pay for an enqueue; formatting and the (possibly slow) stdout writes
+    happen on the listener thread, which is flushed at exit.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+    records = queue.SimpleQueue()
+    handler = DeferredQueueHandler(records)
+    handler.addFilter(RateLimitFilter(burst, interval))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    set_log_level(level)
+
+    _listener = QueueListener(records, output)
+    _listener.start()
+    if fmt not in LOG_FORMATS:
+        logger.warning("Unknown log format %s, using text", fmt)
+    return _listener
+
+
+def set_log_level(level):
+    try:
+        logging.getLogger().setLevel(str(level or 'INFO').upper())
+    except ValueError:
+        logging.getLogger().setLevel(logging.INFO)
+        logger.warning("Unknown log level %s, using INFO", level)
+
+
+def flush_logging():
+    """Stop the writer thread after it has written everything queued."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(flush_logging)
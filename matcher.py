@@ -0,0 +1,146 @@
+import heapq
+import random
+import string
+import time
+
+try:
+    from rapidfuzz import fuzz as rapidfuzz_fuzz, process as rapidfuzz_process
+except ImportError:
+    rapidfuzz_fuzz = None
+    rapidfuzz_process = None
+
+try:
+    import numpy  # process.cdist needs numpy for its result matrix
+except ImportError:
+    numpy = None
+
+try:
+    from fuzzywuzzy import fuzz as fuzzywuzzy_fuzz
+except ImportError:
+    fuzzywuzzy_fuzz = None
+
+
+class FuzzywuzzyMatcher:
+    """Pure Python scorer; one ratio() call per (query, candidate) pair."""
+    name = 'fuzzywuzzy'
+
+    def ratio(self, a, b):
+        return fuzzywuzzy_fuzz.ratio(a.lower(), b.lower())
+
+    def score_matrix(self, queries, candidates):
+        lowered = [candidate.lower() for candidate in candidates]
+        return [[fuzzywuzzy_fuzz.ratio(query.lower(), candidate) for candidate in lowered] for query in queries]
+
+    def extract(self, query, candidates, limit=5, score_cutoff=0):
+        query = query.lower()
+        scored = [(candidate, fuzzywuzzy_fuzz.ratio(query, candidate.lower()), idx) for idx, candidate in enumerate(candidates)]
+        scored = [match for match in scored if match[1] >= score_cutoff]
+        scored.sort(key=lambda match: match[1], reverse=True)
+        return scored[:limit]
+
+    def extract_many(self, queries, candidates, limit=5, score_cutoff=0):
+        results = []
+        for row in self.score_matrix(queries, candidates):
+            best = heapq.nlargest(limit, range(len(row)), key=row.__getitem__)
+            results.append([(candidates[idx], row[idx], idx) for idx in best if row[idx] >= score_cutoff])
+        return results
+
+
+class RapidfuzzMatcher:
+    """Native scorer; whole query x candidate grids are scored in a single call.
+
+    Scores are rounded to integers like fuzzywuzzy's, so thresholds such as "> 90" and score_cutoff
+    accept the same pairs whichever backend is installed.
+    """
+    name = 'rapidfuzz'
+
+    def ratio(self, a, b):
+        return round(rapidfuzz_fuzz.ratio(a.lower(), b.lower()))
+
+    def score_matrix(self, queries, candidates):
+        if numpy is None:
+            lowered = [candidate.lower() for candidate in candidates]
+            return [[round(rapidfuzz_fuzz.ratio(query.lower(), candidate)) for candidate in lowered] for query in queries]
+        scores = rapidfuzz_process.cdist(queries, candidates, scorer=rapidfuzz_fuzz.ratio, processor=str.lower, workers=-1)
+        return numpy.rint(scores).astype(int).tolist()
+
+    def extract(self, query, candidates, limit=5, score_cutoff=0):
+        # The cutoff is applied after rounding; 89.5 rounds to 90 and passes a cutoff of 90
+        matches = rapidfuzz_process.extract(query, candidates, scorer=rapidfuzz_fuzz.ratio, processor=str.lower,
+                                            limit=limit, score_cutoff=max(score_cutoff - 0.5, 0))
+        return [(candidate, round(score), idx) for candidate, score, idx in matches if round(score) >= score_cutoff]
+
+    def extract_many(self, queries, candidates, limit=5, score_cutoff=0):
+        if numpy is None:
+            return [self.extract(query, candidates, limit=limit, score_cutoff=score_cutoff) for query in queries]
+        scores = rapidfuzz_process.cdist(queries, candidates, scorer=rapidfuzz_fuzz.ratio, processor=str.lower,
+                                         score_cutoff=max(score_cutoff - 0.5, 0), workers=-1)
+        scores = numpy.rint(scores)
+        results = []
+        for row in scores:
+            # Partial selection of the top scores keeps this linear in the catalog size
+            top = row.argpartition(-limit)[-limit:] if len(row) > limit else range(len(row))
+            best = sorted(top, key=lambda idx: row[idx], reverse=True)
+            results.append([(candidates[idx], int(row[idx]), int(idx)) for idx in best if row[idx] >= score_cutoff and row[idx] > 0])
+        return results
+
+
+BACKENDS = {}
+if rapidfuzz_process is not None:
+    BACKENDS[RapidfuzzMatcher.name] = RapidfuzzMatcher
+if fuzzywuzzy_fuzz is not None:
+    BACKENDS[FuzzywuzzyMatcher.name] = FuzzywuzzyMatcher
+
+_matcher = None
+
+def get_matcher():
+    global _matcher
+    if _matcher is None:
+        if not BACKENDS:
+            raise ImportError("No fuzzy matching backend available; install rapidfuzz or fuzzywuzzy")
+        # Prefer the native backend, keep the original scorer as the fallback
+        backend = BACKENDS.get(RapidfuzzMatcher.name) or BACKENDS[FuzzywuzzyMatcher.name]
+        _matcher = backend()
+    return _matcher
+
+def set_matcher(name):
+    global _matcher
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown or unavailable matcher backend: {name}")
+    _matcher = BACKENDS[name]()
+    return _matcher
+
+def ratio(a, b):
+    return get_matcher().ratio(a, b)
+
+def score_matrix(queries, candidates):
+    return get_matcher().score_matrix(queries, candidates)
+
+def extract(query, candidates, limit=5, score_cutoff=0):
+    return get_matcher().extract(query, candidates, limit=limit, score_cutoff=score_cutoff)
+
+def extract_many(queries, candidates, limit=5, score_cutoff=0):
+    return get_matcher().extract_many(queries, candidates, limit=limit, score_cutoff=score_cutoff)
+
+
+def benchmark(num_queries=100, num_candidates=2000, seed=0):
+    rng = random.Random(seed)
+
+    def random_title():
+        words = [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9))) for _ in range(rng.randint(1, 4))]
+        return ' '.join(words).title()
+
+    candidates = [random_title() for _ in range(num_candidates)]
+    queries = [rng.choice(candidates) if i % 2 else random_title() for i in range(num_queries)]
+
+    for name, backend in BACKENDS.items():
+        matcher = backend()
+        start = time.perf_counter()
+        matcher.extract_many(queries, candidates)
+        elapsed = time.perf_counter() - start
+        pairs = num_queries * num_candidates
+        print(f"{name}: {pairs} pairs in {elapsed:.3f}s ({pairs / elapsed:,.0f} pairs/s)")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,30 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def refresh_section(plex_url, plex_token, section_id, path=None):
+    """Ask Plex to scan one library section, limited to path when given."""
+    if not plex_url or not plex_token or not section_id:
+        return False
+    import requests
+    params = {'X-Plex-Token': plex_token}
+    if path:
+        params['path'] = path
+    try:
+        response = requests.get(f"{plex_url.rstrip('/')}/library/sections/{section_id}/refresh", params=params, timeout=10)
+        response.raise_for_status()
+        return True
+    except requests.exceptions.RequestException as e:
+        logger.error("Error refreshing Plex section %s: %s", section_id, e)
+        return False
+
+
+def refresh_library(library):
+    """Refresh the TV and movie sections a library routes to."""
+    plex_url, plex_token = library.get('plex_url'), library.get('plex_token')
+    refreshed = refresh_section(plex_url, plex_token, library.get('plex_tv_section_id'), library.get('dest_dir'))
+    refreshed = refresh_section(plex_url, plex_token, library.get('plex_movie_section_id'), library.get('dest_dir_movies')) or refreshed
+    if refreshed:
+        logger.info("Refreshed Plex sections for %s", library['name'])
+    return refreshed
@@ -0,0 +1,204 @@
+import os
+import re
+import sqlite3
+from config import relative_links_for
+from db import DB_FILE, like_prefix
+from linkwriter import LinkWriter
+
+BATCH_SIZE = 5000
+SAMPLE_SIZE = 10
+
+ISSUE_TYPES = ('missing', 'dangling', 'duplicate', 'orphaned')
+
+
+def scan_tree(top):
+    """Yield (path, is_link, link_target) for every entry under top, one scandir per directory."""
+    stack = [top]
+    while stack:
+        path = stack.pop()
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_symlink():
+                        target = os.readlink(entry.path)
+                        if not os.path.isabs(target):
+                            target = os.path.normpath(os.path.join(path, target))
+                        yield entry.path, True, target
+                    elif entry.is_dir(follow_symlinks=False):
+                        yield entry.path, False, None
+                        stack.append(entry.path)
+                    else:
+                        yield entry.path, False, None
+        except FileNotFoundError:
+            continue
+
+
+def insert_batched(cursor, sql, rows):
+    """Insert rows in batches; returns how many there were."""
+    batch = []
+    count = 0
+    for row in rows:
+        batch.append(row)
+        count += 1
+        if len(batch) >= BATCH_SIZE:
+            cursor.executemany(sql, batch)
+            batch.clear()
+    if batch:
+        cursor.executemany(sql, batch)
+    return count
+
+
+def extract_tmdb_id_from_path(path):
+    match = re.search(r'\{tmdb-(\d+)\}', path)
+    return match.group(1) if match else None
+
+
+def reconcile_library(libraries, repair=False):
+    """Compare the link trees of every library with MediaItems and optionally fix what differs.
+
+    Both trees are loaded into temporary tables and compared with SQL joins, so memory stays flat
+    no matter how large the library is. Whether a link dangles is decided from a listing of
+    src_dirs rather than a stat per link, which would hit the debrid mount once per episode. All
+    libraries are checked together, since MediaItems holds the links of every one of them.
+
+    A src_dir that lists no entries is taken for an unmounted debrid mount: links into it are never
+    reported as dangling, and their records are left alone.
+    """
+    src_dirs = [library['src_dir'] for library in libraries]
+    dest_dirs = [dest for library in libraries for dest in (library['dest_dir'], library['dest_dir_movies'])]
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    cursor.execute('''CREATE TEMP TABLE ReconcileLinks (path TEXT PRIMARY KEY, target TEXT, tree TEXT)''')
+    cursor.execute('''CREATE TEMP TABLE ReconcileEntries (path TEXT PRIMARY KEY)''')
+    cursor.execute('''CREATE TEMP TABLE ReconcileSources (path TEXT PRIMARY KEY)''')
+    cursor.execute('''CREATE TEMP TABLE ReconcileIssues (kind TEXT, path TEXT, target TEXT)''')
+    cursor.execute('''CREATE TEMP TABLE ReconcileOffline (prefix TEXT)''')
+
+    link_rows, entry_rows = [], []
+
+    def flush():
+        cursor.executemany('''INSERT OR REPLACE INTO ReconcileLinks (path, target, tree) VALUES (?, ?, ?)''', link_rows)
+        # Non-link entries (e.g. copied directories) are recorded so they don't count as missing links
+        cursor.executemany('''INSERT OR IGNORE INTO ReconcileEntries (path) VALUES (?)''', entry_rows)
+        link_rows.clear()
+        entry_rows.clear()
+
+    for dest_dir in dest_dirs:
+        for tree in ("Cleaned", "Uncleaned"):
+            for path, is_link, target in scan_tree(os.path.join(dest_dir, tree)):
+                if is_link:
+                    link_rows.append((path, target, tree))
+                else:
+                    entry_rows.append((path,))
+                if len(link_rows) + len(entry_rows) >= BATCH_SIZE:
+                    flush()
+    flush()
+    for src_dir in src_dirs:
+        listed = insert_batched(cursor, '''INSERT OR IGNORE INTO ReconcileSources (path) VALUES (?)''',
+                                ((path,) for path, _, _ in scan_tree(src_dir)))
+        if not listed:
+            print(f"Source directory {src_dir} is empty or not mounted; not checking links into it for dangling")
+            cursor.execute('''INSERT INTO ReconcileOffline (prefix) VALUES (?)''',
+                           (like_prefix(src_dir.rstrip(os.sep) + os.sep),))
+    cursor.execute('''CREATE INDEX temp.idx_reconcile_target ON ReconcileLinks (target)''')
+
+    cursor.execute('''
+        INSERT INTO ReconcileIssues (kind, path, target)
+        SELECT 'missing', m.symlink, m.src_dir
+        FROM MediaItems m
+        LEFT JOIN ReconcileLinks l ON l.path = m.symlink
+        LEFT JOIN ReconcileEntries e ON e.path = m.symlink
+        WHERE m.deprecated = 0 AND l.path IS NULL AND e.path IS NULL
+    ''')
+    cursor.execute('''
+        INSERT INTO ReconcileIssues (kind, path, target)
+        SELECT 'dangling', l.path, l.target
+        FROM ReconcileLinks l
+        LEFT JOIN ReconcileSources s ON s.path = l.target
+        WHERE s.path IS NULL
+          AND NOT EXISTS (SELECT 1 FROM ReconcileOffline o WHERE l.target LIKE o.prefix ESCAPE '\\')
+    ''')
+    # Two Cleaned links for one source: keep the one MediaItems records, else the first by path
+    cursor.execute('''
+        INSERT INTO ReconcileIssues (kind, path, target)
+        SELECT 'duplicate', l.path, l.target
+        FROM ReconcileLinks l
+        JOIN ReconcileSources s ON s.path = l.target
+        JOIN (SELECT target, MIN(path) AS first_path FROM ReconcileLinks WHERE tree = 'Cleaned'
+              GROUP BY target HAVING COUNT(*) > 1) d ON d.target = l.target
+        LEFT JOIN MediaItems m ON m.src_dir = l.target
+            AND m.symlink IN (SELECT path FROM ReconcileLinks WHERE target = l.target)
+        WHERE l.tree = 'Cleaned' AND l.path != COALESCE(m.symlink, d.first_path)
+    ''')
+    cursor.execute('''
+        INSERT INTO ReconcileIssues (kind, path, target)
+        SELECT 'orphaned', l.path, l.target
+        FROM ReconcileLinks l
+        JOIN ReconcileSources s ON s.path = l.target
+        LEFT JOIN MediaItems m ON m.src_dir = l.target
+        WHERE m.src_dir IS NULL
+          AND l.path NOT IN (SELECT path FROM ReconcileIssues WHERE kind = 'duplicate')
+    ''')
+
+    counts = dict.fromkeys(ISSUE_TYPES, 0)
+    for kind, count in cursor.execute('''SELECT kind, COUNT(*) FROM ReconcileIssues GROUP BY kind''').fetchall():
+        counts[kind] = count
+    for kind in ISSUE_TYPES:
+        print(f"{kind.capitalize()} links: {counts[kind]}")
+        for path, target in cursor.execute('''SELECT path, target FROM ReconcileIssues WHERE kind = ? LIMIT ?''', (kind, SAMPLE_SIZE)).fetchall():
+            print(f"  {path} -> {target}")
+
+    if repair:
+        repair_issues(conn, libraries)
+
+    conn.close()
+    return counts
+
+
+def source_exists(path):
+    try:
+        os.lstat(path)
+        return True
+    except OSError:
+        return False
+
+
+def repair_issues(conn, libraries):
+    cursor = conn.cursor()
+    issues = conn.cursor()
+    # Recreated links take the form their library uses
+    writers = {relative: LinkWriter(relative=relative) for relative in (False, True)}
+    try:
+        issues.execute('''SELECT kind, path, target FROM ReconcileIssues
+                          WHERE kind != 'missing' OR target IN (SELECT path FROM ReconcileSources)''')
+        while True:
+            rows = issues.fetchmany(BATCH_SIZE)
+            if not rows:
+                break
+            for kind, path, target in rows:
+                if kind == 'missing':
+                    writers[relative_links_for(target, libraries)].link(target, path)
+                elif kind in ('dangling', 'duplicate'):
+                    # The listing may be stale or partial; never remove a link whose source is there
+                    if kind == 'dangling' and source_exists(target):
+                        continue
+                    try:
+                        os.unlink(path)
+                    except FileNotFoundError:
+                        pass
+                    cursor.execute('''UPDATE MediaItems SET deprecated = 1 WHERE symlink = ?''', (path,))
+                elif kind == 'orphaned':
+                    tmdb_id = extract_tmdb_id_from_path(path) if f"{os.sep}Cleaned{os.sep}" in path else None
+                    cursor.execute('''INSERT OR IGNORE INTO MediaItems (src_dir, symlink, tmdb_id) VALUES (?, ?, ?)''',
+                                   (target, path, tmdb_id))
+        # Recorded links whose source is gone can't be recreated; retire them
+        cursor.execute('''
+            UPDATE MediaItems SET deprecated = 1
+            WHERE symlink IN (SELECT i.path FROM ReconcileIssues i WHERE i.kind = 'missing'
+                              AND i.target NOT IN (SELECT path FROM ReconcileSources)
+                              AND NOT EXISTS (SELECT 1 FROM ReconcileOffline o WHERE i.target LIKE o.prefix ESCAPE '\\'))
+        ''')
+    finally:
+        for writer in writers.values():
+            writer.close()
+    conn.commit()
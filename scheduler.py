@@ -0,0 +1,115 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Highest priority first: new torrents are linked before queued resolutions, retries and backfill
+LANES = ('fresh', 'resolved', 'retry', 'backfill')
+
+
+class Task:
+    """A periodic job whose interval shrinks to min_interval after it finds work and doubles while idle."""
+
+    def __init__(self, name, lane, func, min_interval, max_interval, pending=None):
+        self.name = name
+        self.lane = lane
+        self.func = func
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.pending = pending
+        self.interval = min_interval
+        self.next_run = None
+        self.runs = 0
+
+    def reschedule(self, did_work, now):
+        if did_work:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * 2, self.max_interval)
+        self.next_run = now + self.interval
+
+
+class LaneStats:
+    def __init__(self):
+        self.runs = 0
+        self.work = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        self.depth = 0
+
+    def record(self, lag, work):
+        self.runs += 1
+        self.work += work
+        self.total_lag += lag
+        self.max_lag = max(self.max_lag, lag)
+
+
+class Scheduler:
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.tasks = []
+        self.stats = {lane: LaneStats() for lane in LANES}
+
+    def add(self, task):
+        if task.lane not in self.stats:
+            raise ValueError(f"Unknown lane: {task.lane}")
+        task.next_run = self.clock()
+        self.tasks.append(task)
+        return task
+
+    def trigger(self, name):
+        """Run a task at the next opportunity and poll it at full speed again."""
+        for task in self.tasks:
+            if task.name == name:
+                task.next_run = self.clock()
+                task.interval = task.min_interval
+
+    def due_tasks(self, now):
+        due = [task for task in self.tasks if task.next_run <= now]
+        due.sort(key=lambda task: (LANES.index(task.lane), task.next_run))
+        return due
+
+    def run_next(self):
+        """Run the most urgent due task; returns False when nothing is due."""
+        now = self.clock()
+        due = self.due_tasks(now)
+        for stats in self.stats.values():
+            stats.depth = 0
+        for task in due:
+            self.stats[task.lane].depth += 1 + (task.pending() if task.pending else 0)
+        if not due:
+            return False
+        task = due[0]
+        lag = now - task.next_run
+        try:
+            work = task.func() or 0
+        except Exception as e:
+            logger.exception("Task %s failed: %s", task.name, e)
+            work = 0
+        task.runs += 1
+        self.stats[task.lane].record(lag, int(work))
+        task.reschedule(bool(work), self.clock())
+        return True
+
+    def seconds_until_next(self):
+        if not self.tasks:
+            return None
+        return max(0.0, min(task.next_run for task in self.tasks) - self.clock())
+
+    def run_forever(self, wait, on_wake=None):
+        """Run due tasks, then block in wait(timeout) until the next one is due; wait returns True when woken early."""
+        while True:
+            while self.run_next():
+                pass
+            if wait(self.seconds_until_next()) and on_wake:
+                on_wake()
+
+    def report(self):
+        for lane in LANES:
+            stats = self.stats[lane]
+            average_lag = stats.total_lag / stats.runs if stats.runs else 0.0
+            intervals = ', '.join(f"{task.name} every {task.interval:.0f}s" for task in self.tasks if task.lane == lane)
+            logger.info("Lane %s: depth %d, runs %d, work %d, lag avg %.1fs max %.1fs (%s)",
+                        lane, stats.depth, stats.runs, stats.work, average_lag, stats.max_lag, intervals,
+                        extra={'fields': {'event': 'lane', 'lane': lane, 'depth': stats.depth, 'runs': stats.runs,
+                                          'work': stats.work, 'lag_avg': round(average_lag, 1), 'lag_max': round(stats.max_lag, 1)}})
@@ -1,27 +1,63 @@
 import os
 import argparse
-import shutil
+import logging
 import re
+import threading
 import time
-from datetime import datetime, timedelta
-from colorama import init, Fore, Style
-from config import get_settings, prompt_for_settings
-from db import initialize_db, log_processed_folder, get_processed_folders, log_multiple_match, get_multiple_matches, get_unresolved_multiple_matches, update_multiple_match_solution, delete_multiple_match, log_media_item, build_inverted_index, search_inverted_index
-from tmdb import search_tv_show, search_tv_show_by_id, search_movie, tmdb_search, update_series_names_from_overseer
-from utils import extract_year, extract_resolution, extract_folder_year, sanitize_title
-from collections import defaultdict
-
-def group_matches_by_folder(matches):
-    grouped = defaultdict(list)
-    for match in matches:
-        id, original_name, possible_matches, folder_paths = match
-        for folder_path in folder_paths:
-            grouped[folder_path].append((id, original_name, possible_matches))
-    return grouped
-
-init(autoreset=True)
+from config import get_settings, get_libraries, library_for_path, resolve_folders, prompt_for_settings, subscribe, set_headless, is_headless, missing_settings, env_var_name, SETTINGS_FILE
+from db import initialize_db, log_processed_folder, get_processed_folders, log_multiple_match, get_multiple_matches, get_unresolved_multiple_matches, get_resolved_multiple_matches, get_multiple_match_retry_times, update_multiple_match_solution, delete_multiple_match, mark_folder_deprecated, iter_media_items, build_inverted_index, search_inverted_index, get_all_tmdb_series_names, build_catalog_index, get_tmdb_catalog_count, get_tmdb_series_count, import_tmdb_catalog, get_stats, get_show_aliases, store_show_aliases, get_selected_episode_sources, log_episode_sources
+from utils import extract_year, extract_resolution, extract_folder_year, sanitize_title, normalize_show_stem, release_quality
+from episodes import parse_episode, episode_identifier, season_folder, episode_show_name, parse_identifier
+from linkwriter import LinkWriter
+from trigram import generate_ngrams
+from reconcile import reconcile_library
+from journal import run_operations, replay_journal
+from scheduler import Scheduler, Task
+from plex import refresh_library
+from logs import setup_logging, set_log_level
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# tmdb (requests), matcher (fuzzy matching) and colorama are imported where they are first needed, so
+# one-shot commands and scans of already known shows start without loading them
+
+logger = logging.getLogger('symlinkcreator')
 
 processed_files = set()
+processed_files_lock = threading.Lock()  # library threads add to it while a hook removes folders from it
+
+index_lock = threading.Lock()  # library scans run on threads and share the indexes
+
+catalog_index_cache = None
+catalog_index_cache_size = None
+
+series_index_cache = None
+series_index_cache_size = None
+
+MAX_TITLE_LENGTH = 80
+
+# An inverted index hit is only remembered as an alias when this share of the trigrams of the
+# longer of query and title overlap; weaker hits are re-searched on the next release
+ALIAS_MIN_OVERLAP = 0.8
+
+def get_catalog_index():
+    """Build the trigram index over TmdbCatalog once, and again only after a new import."""
+    global catalog_index_cache, catalog_index_cache_size
+    with index_lock:
+        size = get_tmdb_catalog_count()
+        if size != catalog_index_cache_size:
+            catalog_index_cache = build_catalog_index() if size else {}
+            catalog_index_cache_size = size
+        return catalog_index_cache
+
+def get_series_index():
+    """One TmdbSeriesNames index shared by every library scan, rebuilt when names are added."""
+    global series_index_cache, series_index_cache_size
+    with index_lock:
+        size = get_tmdb_series_count()
+        if size != series_index_cache_size:
+            series_index_cache = build_inverted_index()
+            series_index_cache_size = size
+        return series_index_cache
 
 def clean_filename(filename):
     """Clean up the filename to avoid double dashes and other inconsistencies."""
@@ -30,325 +66,402 @@ def clean_filename(filename):
     filename = re.sub(r' -$', '', filename)  # Remove trailing dash
     return filename
 
-# symlinkcreator.py
+def clean_show_name(show_name):
+    return re.sub(r'\s+$|_+$|-+$|(\()$', '', show_name).rstrip()
 
-# symlinkcreator.py
+def season_keys(tmdb_id, identifiers):
+    """The (tmdb_id, season) pairs whose episode titles name these episodes."""
+    if not tmdb_id:
+        return set()
+    return {(int(tmdb_id), parsed[0]) for parsed in map(parse_identifier, identifiers) if parsed}
 
-def create_symlinks(src_dir, dest_dir, dest_dir_movies, force=False, id='tmdb', quick_scan=False):
-    cleaned_dir = os.path.join(dest_dir, "Cleaned")
-    uncleaned_dir = os.path.join(dest_dir, "Uncleaned")
-    cleaned_dir_movies = os.path.join(dest_dir_movies, "Cleaned")
-    uncleaned_dir_movies = os.path.join(dest_dir_movies, "Uncleaned")
+def prefetch_season_keys(plans, aliases):
+    """Seasons in the scan whose show is already known, so they can be fetched before any folder is linked."""
+    keys = set()
+    for plan in plans:
+        if not plan['is_series']:
+            continue
+        for _, identifier, show_name, _, _, _, _ in plan['files']:
+            show_folder = aliases.get(show_alias_stem(clean_show_name(show_name), plan['folder_name'])) if identifier else None
+            if show_folder:
+                keys |= season_keys(extract_tmdb_id_from_show_folder(show_folder), [identifier])
+    return keys
+
+def episode_title(titles, tmdb_id, identifier):
+    """The cached TMDb title of an episode, safe for a file name, or None."""
+    parsed = parse_identifier(identifier)
+    if not tmdb_id or not parsed:
+        return None
+    title = titles.get((int(tmdb_id), parsed[0]), {}).get(parsed[1])
+    # Placeholder titles get replaced once the episode airs; naming by them would mean a rename later
+    if not title or re.fullmatch(r'Episode \d+', title):
+        return None
+    return re.sub(r'[\\/:*?"<>|]', '', title).strip()[:MAX_TITLE_LENGTH].strip() or None
+
+def split_show_year(show_folder, folder_name):
+    year = extract_folder_year(folder_name) or extract_year(show_folder)
+    if year:
+        show_folder = re.sub(r'\(\d{4}\)$', '', show_folder).strip()
+        show_folder = re.sub(r'\d{4}$', '', show_folder).strip()
+
+    if not show_folder and year:
+        # Use the year as the search term if the show name is empty
+        show_folder = str(year)
+        year = None
+    return show_folder, year
+
+def show_alias_stem(show_folder, folder_name):
+    return normalize_show_stem(*split_show_year(show_folder, folder_name))
+
+def resolve_show_folder(show_folder, folder_name, inverted_index, multiple_matches, id='tmdb', force=False, folder_path=None, catalog_index=None, aliases=None):
+    show_folder, year = split_show_year(show_folder, folder_name)
+
+    # A show that was resolved before (by any release) skips the whole search chain
+    stem = normalize_show_stem(show_folder, year)
+    if aliases is not None and stem in aliases:
+        logger.debug("Resolved %s from alias: %s", show_folder, aliases[stem])
+        return aliases[stem]
+
+    query = show_folder
+
+    # Normalize show_folder for inverted index search
+    normalized_show_folder = re.sub(r'[^a-z0-9\s.]', '', show_folder.lower())
+
+    logger.debug("Searching inverted index for: %s with year: %s", normalized_show_folder, year)
+
+    # First attempt to find the show using the inverted index, allowing the year to be off by one
+    index_query = normalized_show_folder
+    search_results = search_inverted_index(index_query, inverted_index, year, year_tolerance=1)
+    show_folder = None
+    if not search_results and catalog_index:
+        # Then the imported TMDb catalog, which resolves most long-running shows locally
+        from tmdb import search_tmdb_catalog
+        logger.debug("Searching local TMDb catalog for: %s with year: %s", query, year)
+        show_folder = search_tmdb_catalog(query, catalog_index, year)
+    if not search_results and not show_folder:
+        # Fallback to TMDb search if the local searches fail
+        from tmdb import search_tv_show
+        logger.debug("Searching TMDb for: %s with year: %s", query, year)
+        show_folder = search_tv_show(query, year, id=id, force=force, folder_path=folder_path)
+
+        if not show_folder:
+            # Fallback to replacing spaces with periods and searching again
+            fallback_show_folder = normalized_show_folder.replace(' ', '.')
+            logger.debug("Fallback search inverted index for: %s with year: %s", fallback_show_folder, year)
+            index_query = fallback_show_folder
+            search_results = search_inverted_index(index_query, inverted_index, year, year_tolerance=1)
+            if not search_results:
+                logger.debug("Fallback search TMDb for: %s with year: %s", fallback_show_folder, year)
+                show_folder = search_tv_show(fallback_show_folder, year, id=id, force=force, folder_path=folder_path)
+
+                # If all year-based searches fail, search without the year
+                if not search_results and not show_folder and year:
+                    # Fallback search without year
+                    logger.debug("Fallback search inverted index for: %s without year", normalized_show_folder)
+                    index_query = normalized_show_folder
+                    search_results = search_inverted_index(index_query, inverted_index)
+                    if not search_results:
+                        logger.debug("Fallback search TMDb for: %s without year", query)
+                        show_folder = search_tv_show(query, None, id=id, force=force, folder_path=folder_path)
+
+    # Catalog and TMDb matches already passed an exact-name or ratio check
+    confident = True
+    if search_results:
+        best_match, score = search_results[0]
+        show_folder = f"{best_match[0]} ({best_match[2]}) {{tmdb-{best_match[1]}}}"
+        trigrams = max(len(generate_ngrams(index_query)), len(generate_ngrams(best_match[0])))
+        confident = score >= ALIAS_MIN_OVERLAP * trigrams
+
+    if show_folder is None:
+        return None
+    if show_folder in multiple_matches:
+        show_folder = multiple_matches[show_folder]
+    show_folder = show_folder.replace('/', '')
+    if aliases is not None and confident:
+        aliases[stem] = show_folder
+        store_show_aliases([stem], show_folder, 'match')
+    return show_folder
+
+def plan_folder(root, names, skip_files=frozenset()):
+    """Parse one source folder into a picklable plan; touches nothing but the regexes (and ffprobe as a last resort)."""
+    folder_name = os.path.basename(root)
+    parent_folder_name = os.path.basename(os.path.dirname(root))
+    # Resolution tags on the pack folder apply to every episode inside it
+    folder_resolution = extract_resolution('', folder_name)
+    files = []
+    absolute_count = 0
+
+    for file in names:
+        src_file = os.path.join(root, file)
+        if src_file in skip_files:
+            continue
 
-    os.makedirs(cleaned_dir, exist_ok=True)
-    os.makedirs(uncleaned_dir, exist_ok=True)
-    os.makedirs(cleaned_dir_movies, exist_ok=True)
-    os.makedirs(uncleaned_dir_movies, exist_ok=True)
+        episode = parse_episode(file)
+        if not episode:
+            files.append((file, None, None, None, None, None, False))
+            continue
+        if episode.kind == 'absolute':
+            absolute_count += 1
 
-    processed_folders = get_processed_folders()
-    multiple_matches = get_multiple_matches()
+        show_name = episode_show_name(episode, folder_name)
 
-    if quick_scan:
-        dirs_to_check = [os.path.join(src_dir, d) for d in os.listdir(src_dir) if os.path.isdir(os.path.join(src_dir, d))]
+        show_name = sanitize_title(show_name)
+
+        name, ext = os.path.splitext(file)
+        
+        if '.' in name:
+            new_name = re.sub(r'\.', ' ', name)
+        else:
+            new_name = name
+
+        resolution = folder_resolution or extract_resolution(new_name, None, src_file)
+
+        quality, is_dir = release_quality(file, resolution, src_file)
+        files.append((file, episode_identifier(episode), show_name, season_folder(episode), resolution, quality, is_dir))
+
+    return {
+        'root': root,
+        'folder_name': folder_name,
+        'combined_folder_name': os.path.join(parent_folder_name, folder_name),
+        # A lone " - 12" could be part of a movie title; absolute numbering needs a second episode to count
+        'is_series': bool(re.search(r'Season|Seasons', folder_name, re.IGNORECASE))
+                     or len([entry for entry in files if entry[1]]) > absolute_count or absolute_count > 1,
+        'files': files,
+    }
+
+def mark_files_processed(root, folder_files):
+    with processed_files_lock:
+        processed_files.update(os.path.join(root, entry[0]) for entry in folder_files)
+
+def is_same_path(path, other):
+    return os.path.normpath(os.path.abspath(path)) == os.path.normpath(os.path.abspath(other))
+
+def plan_tree(path, recursive=True):
+    if not recursive:
+        return [plan_folder(path, os.listdir(path))]
+    return [plan_folder(root, dirs + files) for root, dirs, files in os.walk(path)]
+
+def iter_folder_plans(src_dir, processed_folders, quick_scan=False, workers=None, backoff_folders=frozenset(), folders=None):
+    if folders is not None:
+        # Only the folders a library update hook named
+        for folder in folders:
+            for root, dirs, files in os.walk(folder):
+                yield plan_folder(root, dirs + files, processed_files)
+    elif quick_scan:
+        for d in os.listdir(src_dir):
+            root = os.path.join(src_dir, d)
+            if root in backoff_folders or not os.path.isdir(root):
+                continue
+            if os.path.join(os.path.basename(src_dir), d) in processed_folders:
+                continue
+            yield plan_folder(root, os.listdir(root), processed_files)
+    elif workers and workers > 1:
+        # Shard the top-level folders across processes; plans come back here, where the
+        # single writer owns the DB and every filesystem mutation. The src_dir root itself is never a show.
+        top_level_dirs = [os.path.join(src_dir, d) for d in os.listdir(src_dir) if os.path.isdir(os.path.join(src_dir, d))]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for plans in executor.map(plan_tree, top_level_dirs):
+                yield from plans
     else:
-        dirs_to_check = []
         for root, dirs, files in os.walk(src_dir):
-            dirs_to_check.append(root)
+            if is_same_path(root, src_dir):
+                continue
+            yield plan_folder(root, dirs + files, processed_files)
 
-    inverted_index = build_inverted_index()
+def create_symlinks(src_dir, dest_dir, dest_dir_movies, force=False, id='tmdb', quick_scan=False, workers=None, relative_links=False, folders=None, episode_titles=False):
+    cleaned_dir = os.path.join(dest_dir, "Cleaned")
+    uncleaned_dir = os.path.join(dest_dir, "Uncleaned")
+    cleaned_dir_movies = os.path.join(dest_dir_movies, "Cleaned")
+    uncleaned_dir_movies = os.path.join(dest_dir_movies, "Uncleaned")
 
-    for root in dirs_to_check:
-        folder_name = os.path.basename(root)
-        parent_folder_name = os.path.basename(os.path.dirname(root))
-        combined_folder_name = os.path.join(parent_folder_name, folder_name)
+    writer = LinkWriter(relative=relative_links)
+    writer.ensure_dir(cleaned_dir)
+    writer.ensure_dir(uncleaned_dir)
+    writer.ensure_dir(cleaned_dir_movies)
+    writer.ensure_dir(uncleaned_dir_movies)
 
-        if combined_folder_name == os.path.basename(src_dir):
+    processed_folders = set(get_processed_folders())
+    multiple_matches = get_multiple_matches()
+    # Folders that failed to match recently wait out their backoff instead of hitting TMDb every poll
+    retry_times = get_multiple_match_retry_times()
+    now = time.time()
+    backoff_folders = {folder_path for folder_path, next_retry in retry_times.items() if next_retry > now}
+
+    inverted_index = get_series_index()
+    catalog_index = get_catalog_index()
+    aliases = get_show_aliases()
+    folder_count = 0
+
+    plans = iter_folder_plans(src_dir, processed_folders, quick_scan=quick_scan, workers=workers, backoff_folders=backoff_folders, folders=folders)
+    titles = {}
+    if episode_titles:
+        # Every season of an already known show is fetched up front, concurrently; the rest once per folder
+        from tmdb import get_season_titles
+        plans = list(plans)
+        titles = get_season_titles(prefetch_season_keys(plans, aliases))
+
+    for plan in plans:
+        root = plan['root']
+        folder_name = plan['folder_name']
+        combined_folder_name = plan['combined_folder_name']
+
+        if is_same_path(root, src_dir):
             continue
 
         if combined_folder_name in processed_folders and quick_scan:
             continue
+
+        if root in backoff_folders:
+            continue
         
         log_processed_folder(combined_folder_name, 'processing')
+        folder_count += 1
         
         skip_folder = False
-        contains_episode_match = False
+        # Plans from worker processes can't see processed_files, so filter here as well
+        folder_files = [entry for entry in plan['files'] if os.path.join(root, entry[0]) not in processed_files]
+        # The folder's links are journalled, applied, then committed to the DB in one transaction
+        operations = []
 
-        for file in os.listdir(root):
-            src_file = os.path.join(root, file)
-
-            if src_file in processed_files:
-                continue
-
-            if re.search(r'(S\d{2} ?E\d{2})', file, re.IGNORECASE) or re.search(r'Season|Seasons', folder_name, re.IGNORECASE):
-                contains_episode_match = True
-                break
-
-        if not contains_episode_match:
-            for file in os.listdir(root):
+        if not plan['is_series']:
+            for file, _, _, _, _, _, _ in folder_files:
                 src_file = os.path.join(root, file)
-
-                if src_file in processed_files:
-                    continue
-
-                processed_files.add(src_file)
                 # Process as movie
                 relative_path = os.path.relpath(src_file, src_dir)
                 uncleaned_dest_file = os.path.join(uncleaned_dir_movies, relative_path)
-                os.makedirs(os.path.dirname(uncleaned_dest_file), exist_ok=True)
-                if not os.path.exists(uncleaned_dest_file):
-                    os.symlink(src_file, uncleaned_dest_file)
-                    print(f"Created symlink: {uncleaned_dest_file} -> {src_file}")
-                log_media_item(src_file, uncleaned_dest_file, tmdb_id=None)  # Pass tmdb_id as None for movies
+                operations.append(('link', src_file, uncleaned_dest_file, None, 1))  # tmdb_id is None for movies
+            changed = run_operations(writer, root, operations)
+            mark_files_processed(root, folder_files)
+            logger.info("Linked %s as movie: %d of %d link(s) changed", combined_folder_name, changed, len(operations),
+                        extra={'fields': {'event': 'folder', 'folder': root, 'kind': 'movie', 'files': len(folder_files),
+                                          'links': len(operations), 'changed': changed}})
             continue
 
         show_folder = None
         log_failure = False  # Initialize a flag to log failure only if all attempts fail
+        selected = None
+        candidates = []
+        titles_pending = episode_titles
 
-        for file in os.listdir(root):
+        for file, episode_identifier, show_name, season_folder, resolution, quality, is_dir in folder_files:
             src_file = os.path.join(root, file)
 
-            if src_file in processed_files:
-                continue
-
-            processed_files.add(src_file)
-
-            episode_match = re.search(r'(.*?)(S\d{2} ?E\d{2})', file, re.IGNORECASE)
-
-            if episode_match:
-                episode_identifier = episode_match.group(2)
-            else:
-                episode_identifier = "Unknown"
-
-            if re.match(r'S\d{2} ?E\d{2}', file, re.IGNORECASE):
-                show_name = re.sub(r'\s*(S\d{2}.*|Season \d+).*', '', folder_name).replace('-', ' ').replace('.', ' ').strip()
-            else:
-                show_name = episode_match.group(1).replace('.', ' ').strip() if episode_match else "Unknown"
-
-            show_name = sanitize_title(show_name)
-
-            if not episode_match:
+            if not episode_identifier:
                 if show_folder is None:
-                    show_folder = extract_show_name_from_path(root)
-                    year = extract_folder_year(folder_name) or extract_year(show_folder)
-                    if year:
-                        show_folder = re.sub(r'\(\d{4}\)$', '', show_folder).strip()
-                        show_folder = re.sub(r'\d{4}$', '', show_folder).strip()
-
-                    if not show_folder and year:
-                        # Use the year as the search term if the show name is empty
-                        show_folder = str(year)
-                        year = None
-
-                    # Normalize show_folder for inverted index search
-                    normalized_show_folder = re.sub(r'[^a-z0-9\s.]', '', show_folder.lower())
-
-                    # Log the search criteria
-                    print(f"Searching inverted index for: {normalized_show_folder} with year: {year}")
-
-                    # First attempt to find the show using the inverted index with the year
-                    search_results = search_inverted_index(normalized_show_folder, inverted_index, year)
-                    if not search_results:
-                        # Fallback to TMDb search if the inverted index search fails
-                        print(f"Searching TMDb for: {show_folder} with year: {year}")
-                        show_folder = search_tv_show(show_folder, year, id=id, force=force, folder_path=root)
-
-                        if not show_folder:
-                            # Fallback to replacing spaces with periods and searching again
-                            fallback_show_folder = normalized_show_folder.replace(' ', '.')
-                            print(f"Fallback search inverted index for: {fallback_show_folder} with year: {year}")
-                            search_results = search_inverted_index(fallback_show_folder, inverted_index, year)
-                            if not search_results:
-                                print(f"Fallback search TMDb for: {fallback_show_folder} with year: {year}")
-                                show_folder = search_tv_show(fallback_show_folder, year, id=id, force=force, folder_path=root)
-
-                                # If all year-based searches fail, search without the year
-                                if not search_results and not show_folder and year:
-                                    # Fallback search without year
-                                    print(f"Fallback search inverted index for: {normalized_show_folder} without year")
-                                    search_results = search_inverted_index(normalized_show_folder, inverted_index)
-                                    if not search_results:
-                                        print(f"Fallback search TMDb for: {show_folder} without year")
-                                        show_folder = search_tv_show(show_folder, None, id=id, force=force, folder_path=root)
-
-                    if search_results:
-                        best_match = search_results[0][0]
-                        show_folder = f"{best_match[0]} ({best_match[2]}) {{tmdb-{best_match[1]}}}"
-
+                    show_folder = resolve_show_folder(extract_show_name_from_path(root, src_dir), folder_name, inverted_index, multiple_matches, id=id, force=force, folder_path=root, catalog_index=catalog_index, aliases=aliases)
                     if show_folder is None:
-                        if show_name.lower() != "unknown":
-                            log_failure = True  # Set the flag to log the failure later
-                        print(f"Unprocessed item: {src_file}")
+                        logger.debug("Unprocessed item: %s", src_file)
                         skip_folder = True
                         break
-                    if show_folder in multiple_matches:
-                        show_folder = multiple_matches[show_folder]
-                    show_folder = show_folder.replace('/', '')
                     tmdb_id = extract_tmdb_id_from_show_folder(show_folder)
 
-                extras_folder = os.path.join(cleaned_dir, show_folder, "Extras")
-                os.makedirs(extras_folder, exist_ok=True)
-                extras_dest_file = os.path.join(extras_folder, file)
-                if not os.path.exists(extras_dest_file):
-                    os.symlink(src_file, extras_dest_file)
-                    print(f"Created symlink for extra: {extras_dest_file} -> {src_file}")
-                log_media_item(src_file, extras_dest_file, tmdb_id)  # Include tmdb_id for extras
+                extras_dest_file = os.path.join(cleaned_dir, show_folder, "Extras", file)
+                operations.append(('link', src_file, extras_dest_file, tmdb_id, 1))  # Include tmdb_id for extras
                 continue
 
-            name, ext = os.path.splitext(file)
-            
-            if '.' in name:
-                new_name = re.sub(r'\.', ' ', name)
-            else:
-                new_name = name
-
-            resolution = extract_resolution(new_name, folder_name, src_file)
-
-            if resolution:
-                split_name = new_name.split(resolution)[0]
-                new_name = split_name.strip() + ' ' + resolution + ext
-            else:
-                new_name += ext
-
-            season_number_match = re.search(r'S(\d{2}) ?E\d{2}', episode_identifier, re.IGNORECASE)
-            if season_number_match:
-                season_number = season_number_match.group(1)
-                season_folder = f"Season {int(season_number)}"
-            else:
-                season_folder = "Unknown Season"
+            ext = os.path.splitext(file)[1]
 
             if show_folder is None:
-                show_folder = re.sub(r'\s+$|_+$|-+$|(\()$', '', show_name)
-                show_folder = show_folder.rstrip()
-                year = extract_folder_year(folder_name) or extract_year(show_folder)
-                if year:
-                    show_folder = re.sub(r'\(\d{4}\)$', '', show_folder).strip()
-                    show_folder = re.sub(r'\d{4}$', '', show_folder).strip()
-
-                if not show_folder and year:
-                    # Use the year as the search term if the show name is empty
-                    show_folder = str(year)
-                    year = None
-
-                # Normalize show_folder for inverted index search
-                normalized_show_folder = re.sub(r'[^a-z0-9\s.]', '', show_folder.lower())
-
-                # Log the search criteria
-                print(f"Searching inverted index for: {normalized_show_folder} with year: {year}")
-
-                # First attempt to find the show using the inverted index with the year
-                search_results = search_inverted_index(normalized_show_folder, inverted_index, year)
-                if not search_results:
-                    # Fallback to TMDb search if the inverted index search fails
-                    print(f"Searching TMDb for: {show_folder} with year: {year}")
-                    show_folder = search_tv_show(show_folder, year, id=id, force=force, folder_path=root)
-
-                    if not show_folder:
-                        # Fallback to replacing spaces with periods and searching again
-                        fallback_show_folder = normalized_show_folder.replace(' ', '.')
-                        print(f"Fallback search inverted index for: {fallback_show_folder} with year: {year}")
-                        search_results = search_inverted_index(fallback_show_folder, inverted_index, year)
-                        if not search_results:
-                            print(f"Fallback search TMDb for: {fallback_show_folder} with year: {year}")
-                            show_folder = search_tv_show(fallback_show_folder, year, id=id, force=force, folder_path=root)
-
-                            # If all year-based searches fail, search without the year
-                            if not search_results and not show_folder and year:
-                                # Fallback search without year
-                                print(f"Fallback search inverted index for: {normalized_show_folder} without year")
-                                search_results = search_inverted_index(normalized_show_folder, inverted_index)
-                                if not search_results:
-                                    print(f"Fallback search TMDb for: {show_folder} without year")
-                                    show_folder = search_tv_show(show_folder, None, id=id, force=force, folder_path=root)
-
-                if search_results:
-                    best_match = search_results[0][0]
-                    show_folder = f"{best_match[0]} ({best_match[2]}) {{tmdb-{best_match[1]}}}"
-
+                show_folder = clean_show_name(show_name)
+                show_folder = resolve_show_folder(show_folder, folder_name, inverted_index, multiple_matches, id=id, force=force, folder_path=root, catalog_index=catalog_index, aliases=aliases)
                 if show_folder is None:
                     if show_name.lower() != "unknown":
                         log_failure = True  # Set the flag to log the failure later
-                    print(f"Unprocessed item: {src_file}")
+                    logger.debug("Unprocessed item: %s", src_file)
                     skip_folder = True
                     break
-                if show_folder in multiple_matches:
-                    show_folder = multiple_matches[show_folder]
-                show_folder = show_folder.replace('/', '')
                 tmdb_id = extract_tmdb_id_from_show_folder(show_folder)
 
             cleaned_dest_path = os.path.join(cleaned_dir, show_folder, season_folder)
-            os.makedirs(cleaned_dest_path, exist_ok=True)
+
+            if titles_pending:
+                titles_pending = False
+                missing = season_keys(tmdb_id, [entry[1] for entry in folder_files if entry[1]]) - titles.keys()
+                if missing:
+                    from tmdb import get_season_titles
+                    titles.update(get_season_titles(missing))
 
             dest_file_name = f"{show_folder} - {episode_identifier.strip()}"
+            title = episode_title(titles, tmdb_id, episode_identifier) if episode_titles else None
+            if title:
+                dest_file_name += f" - {title}"
             if resolution:
                 dest_file_name += f" [{resolution}]"
             dest_file_name += ext
 
             dest_file_name = clean_filename(dest_file_name)
             cleaned_dest_file = os.path.join(cleaned_dest_path, dest_file_name)
-            
-            if os.path.islink(cleaned_dest_file):
-                if os.readlink(cleaned_dest_file) == src_file:
-                    continue
-                else:
-                    os.remove(cleaned_dest_file)
-            
-            if os.path.exists(cleaned_dest_file) and not os.path.islink(cleaned_dest_file):
-                continue
 
-            if os.path.isdir(src_file):
-                shutil.copytree(src_file, cleaned_dest_file, symlinks=True)
-            else:
-                os.symlink(src_file, cleaned_dest_file)
-            print(f"Created symlink: {cleaned_dest_file} -> {src_file}")
+            if selected is None:
+                selected = get_selected_episode_sources({episode_key(cleaned_dir, show_folder, entry[3], entry[1])
+                                                         for entry in folder_files if entry[1]})
+            key = episode_key(cleaned_dir, show_folder, season_folder, episode_identifier)
+            candidates.append((key, src_file, cleaned_dest_file, quality))
+            chosen = choose_episode_source(selected, key, src_file, cleaned_dest_file, quality, operations,
+                                           uncleaned_dir, src_dir)
+            if chosen:
+                # Include tmdb_id for series episodes
+                operations.append(('copytree' if is_dir else 'replace', src_file, cleaned_dest_file, tmdb_id, 1))
 
-            relative_path = os.path.relpath(src_file, src_dir)
-            uncleaned_dest_file = os.path.join(uncleaned_dir, relative_path)
-            os.makedirs(os.path.dirname(uncleaned_dest_file), exist_ok=True)
-            if not os.path.exists(uncleaned_dest_file):
-                os.symlink(src_file, uncleaned_dest_file)
-                print(f"Created symlink: {uncleaned_dest_file} -> {src_file}")
+            # A release that lost keeps its Uncleaned link, recorded in MediaItems so it isn't an orphan
+            operations.append(('link', src_file, uncleaned_path(uncleaned_dir, src_dir, src_file), None, 0 if chosen else 1))
 
-            log_media_item(src_file, cleaned_dest_file, tmdb_id)  # Include tmdb_id for series episodes
+        if not skip_folder:
+            operations.append(('processed', None, combined_folder_name, None, 0))
+        changed = run_operations(writer, root, operations)
+        log_episode_sources(candidates, {key: selected[key][0] for key, _, _, _ in candidates})
+        fields = {'event': 'folder', 'folder': root, 'kind': 'series', 'show': show_folder, 'files': len(folder_files),
+                  'episodes': len(candidates), 'changed': changed}
 
         if not skip_folder:
-            log_processed_folder(combined_folder_name, 'processed')
+            # Only now, so a folder that failed to match is planned in full when it is retried
+            mark_files_processed(root, folder_files)
+            if root in retry_times:
+                delete_multiple_match(root)
+            logger.info("Linked %s to %s: %d episode(s), %d link(s) changed", combined_folder_name, show_folder,
+                        len(candidates), changed, extra={'fields': fields})
         else:
             if log_failure:
                 log_multiple_match(folder_name, ["No results found"], root)
-            print(f"Skipping folder: {combined_folder_name}")
+            logger.warning("Skipping folder: %s", combined_folder_name, extra={'fields': dict(fields, event='skipped')})
+
+    writer.close()
+    if folder_count:
+        logger.info("Scanned %d folder(s) in %s", folder_count, src_dir,
+                    extra={'fields': {'event': 'scan', 'src_dir': src_dir, 'folders': folder_count}})
+    return folder_count
+
+def retry_due_matches(src_dir, dest_dir, dest_dir_movies, **kwargs):
+    """Rescan unmatched folders whose retry backoff has run out; the quick scan never revisits them."""
+    now = time.time()
+    prefix = src_dir.rstrip(os.sep) + os.sep
+    due = [folder_path for folder_path, next_retry in get_multiple_match_retry_times().items()
+           if next_retry <= now and folder_path.startswith(prefix) and os.path.isdir(folder_path)]
+    if not due:
+        return 0
+    return create_symlinks(src_dir, dest_dir, dest_dir_movies, folders=due, **kwargs)
 
-    # ... other code ...
 
 def search_inverted_index_with_year_range(query, inverted_index, year, range_delta):
-    results = []
-    if year:
-        for delta in range(-range_delta, range_delta + 1):
-            search_results = search_inverted_index(query, inverted_index, year + delta)
-            if search_results:
-                results.extend(search_results)
-    else:
-        results = search_inverted_index(query, inverted_index)
-    return results
+    return search_inverted_index(query, inverted_index, year, year_tolerance=range_delta)
 
 def search_tv_show_with_year_range(query, year, id, force, folder_path, range_delta):
-    if year is not None:
-        for delta in range(-range_delta, range_delta + 1):
-            result = search_tv_show(query, year + delta, id=id, force=force, folder_path=folder_path)
-            if result:
-                return result
-    else:
-        result = search_tv_show(query, year, id=id, force=force, folder_path=folder_path)
-        if result:
-            return result
-    return None
+    from tmdb import search_tv_show
+    return search_tv_show(query, year, id=id, force=force, folder_path=folder_path, year_tolerance=range_delta)
 
 
-def extract_show_name_from_path(path):
+def extract_show_name_from_path(path, src_dir=None):
+    """Show name from a folder path: the folder's own name at the top of a library, else its parent's."""
     folder_name = os.path.basename(path)
     parent_folder = os.path.basename(os.path.dirname(path))
-
-    if parent_folder.lower() == "torrents":
-        folder_name = folder_name if folder_name.lower() != "unknown" else None
+    if src_dir is None:
+        library = library_for_path(path)
+        src_dir = library.get('src_dir') if library else None
+
+    # The parent of a top-level folder is the library root (e.g. __all__), never a show
+    if parent_folder.lower() == "torrents" or (src_dir and is_same_path(os.path.dirname(path), src_dir)):
+        if folder_name.lower() == "unknown":
+            return None
     else:
         folder_name = parent_folder if parent_folder.lower() != "unknown" else folder_name
 
@@ -361,41 +474,74 @@ def extract_show_name_from_path(path):
     folder_name = folder_name.strip()
     return folder_name
 
+def episode_key(cleaned_dir, show_folder, season_folder, episode_identifier):
+    return os.path.join(cleaned_dir, show_folder, season_folder, f"{show_folder} - {episode_identifier.strip()}")
+
+def uncleaned_path(uncleaned_dir, src_dir, src_file):
+    return os.path.join(uncleaned_dir, os.path.relpath(src_file, src_dir))
+
+def choose_episode_source(selected, key, src_file, cleaned_dest_file, quality, operations, uncleaned_dir, src_dir):
+    """Decide whether src_file becomes the linked source for an episode.
+
+    The current source is only replaced by a strictly better one (resolution, then size, then codec)
+    or when its file has gone, so releases of equal quality never flip the link back and forth.
+    A replaced source keeps its Uncleaned link, which takes over its MediaItems row.
+    """
+    current = selected.get(key)
+    if current is not None and current[0] != src_file:
+        current_src, current_link, current_quality = current
+        if tuple(quality) <= tuple(current_quality) and os.path.exists(current_src):
+            return False
+        operations.append(('unlink', current_src, current_link, None, 0))
+        if os.path.exists(current_src):
+            operations.append(('link', current_src, uncleaned_path(uncleaned_dir, src_dir, current_src), None, 1))
+        logger.info("Replacing %s with better source %s", current_src, src_file)
+    elif current is not None and current[1] != cleaned_dest_file:
+        # Same source under a new name; keep a single link for the episode
+        operations.append(('unlink', src_file, current[1], None, 0))
+    selected[key] = (src_file, cleaned_dest_file, quality)
+    return True
+
 def extract_tmdb_id_from_show_folder(show_folder):
     match = re.search(r'\{tmdb-(\d+)\}', show_folder)
     return match.group(1) if match else None
 
 def process_symlink(folder_path, solution):
-    settings = get_settings()
+    # Link into the library the folder came from
+    settings = library_for_path(folder_path) or get_settings()
     dest_dir = settings.get('dest_dir')
-    dest_dir_movies = settings.get('dest_dir_movies')
     cleaned_dir = os.path.join(dest_dir, "Cleaned")
     uncleaned_dir = os.path.join(dest_dir, "Uncleaned")
+    writer = LinkWriter(relative=settings.get('relative_links', False))
+    operations = []
+    show_names = set()
+    selected = {}
+    candidates = []
 
     parent_folder_name = os.path.basename(folder_path)
+    titles = {}
+    if settings.get('episode_titles'):
+        # One lookup for every season in the folder, before the first link
+        from tmdb import get_season_titles
+        episodes = [parse_episode(file) for _, _, files in os.walk(folder_path) for file in files]
+        titles = get_season_titles(season_keys(extract_tmdb_id_from_show_folder(solution.replace('[', '{').replace(']', '}')),
+                                               [episode_identifier(episode) for episode in episodes if episode]))
 
     for root, dirs, files in os.walk(folder_path):
         for file in files:
             src_file = os.path.join(root, file)
 
-            episode_match = re.search(r'(.*?)(S\d{2} ?E\d{2})', file, re.IGNORECASE)
-            if not episode_match:
+            episode = parse_episode(file)
+            if not episode:
                 relative_path = os.path.relpath(os.path.join(root, file), folder_path)
                 uncleaned_dest_file = os.path.join(uncleaned_dir, relative_path)
-                os.makedirs(os.path.dirname(uncleaned_dest_file), exist_ok=True)
-                if not os.path.exists(uncleaned_dest_file):
-                    os.symlink(src_file, uncleaned_dest_file)
-                log_media_item(src_file, uncleaned_dest_file, tmdb_id=None)
+                operations.append(('link', src_file, uncleaned_dest_file, None, 1))
                 continue
 
-            episode_identifier = episode_match.group(2)
-            
-            if re.match(r'S\d{2} ?E\d{2}', file, re.IGNORECASE):
-                show_name = re.sub(r'\s*(S\d{2}.*|Season \d+).*', '', solution).replace('-', ' ').replace('.', ' ').strip()
-            else:
-                show_name = episode_match.group(1).replace('.', ' ').strip()
+            show_name = episode_show_name(episode, solution)
 
             show_name = sanitize_title(show_name)
+            show_names.add(show_name)
 
             name, ext = os.path.splitext(file)
             
@@ -412,65 +558,116 @@ def process_symlink(folder_path, solution):
             else:
                 new_name += ext
 
-            season_number_match = re.search(r'S(\d{2}) ?E\d{2}', episode_identifier, re.IGNORECASE)
-            if season_number_match:
-                season_number = season_number_match.group(1)
-                season_folder = f"Season {int(season_number)}"
-            else:
-                season_folder = "Unknown Season"
-
             show_folder = re.sub(r'\s+$|_+$|-+$|(\()$', '', show_name)
             show_folder = show_folder.rstrip()
             
             show_folder = solution.replace('[', '{').replace(']', '}')
             show_folder = show_folder.replace('/', '')
-            cleaned_dest_path = os.path.join(cleaned_dir, show_folder, season_folder)
-            os.makedirs(cleaned_dest_path, exist_ok=True)
+            cleaned_dest_path = os.path.join(cleaned_dir, show_folder, season_folder(episode))
 
-            dest_file_name = f"{show_name.strip()} - {episode_identifier.strip()}"
+            dest_file_name = f"{show_name.strip()} - {episode_identifier(episode)}"
+            title = episode_title(titles, extract_tmdb_id_from_show_folder(show_folder), episode_identifier(episode))
+            if title:
+                dest_file_name += f" - {title}"
             if resolution:
                 dest_file_name += f" [{resolution}]"
             dest_file_name += ext
 
             dest_file_name = clean_filename(dest_file_name)
             cleaned_dest_file = os.path.join(cleaned_dest_path, dest_file_name)
-            
-            if os.path.islink(cleaned_dest_file):
-                if os.readlink(cleaned_dest_file) == src_file:
-                    continue
-                else:
-                    os.remove(cleaned_dest_file)
-            
-            if os.path.exists(cleaned_dest_file) and not os.path.islink(cleaned_dest_file):
-                continue
 
-            if os.path.isdir(src_file):
-                shutil.copytree(src_file, cleaned_dest_file, symlinks=True)
-            else:
-                os.symlink(src_file, cleaned_dest_file)
+            key = episode_key(cleaned_dir, show_folder, season_folder(episode), episode_identifier(episode))
+            if key not in selected:
+                selected.update(get_selected_episode_sources([key]))
+            quality, is_dir = release_quality(file, resolution, src_file)
+            candidates.append((key, src_file, cleaned_dest_file, quality))
+            chosen = choose_episode_source(selected, key, src_file, cleaned_dest_file, quality, operations,
+                                           uncleaned_dir, settings.get('src_dir'))
+            if chosen:
+                tmdb_id = extract_tmdb_id_from_show_folder(show_folder)
+                operations.append(('copytree' if is_dir else 'replace', src_file, cleaned_dest_file, tmdb_id, 1))
 
             relative_path = os.path.relpath(os.path.join(root, file), folder_path)
             uncleaned_dest_file = os.path.join(uncleaned_dir, relative_path)
-            os.makedirs(os.path.dirname(uncleaned_dest_file), exist_ok=True)
-            if not os.path.exists(uncleaned_dest_file):
-                os.symlink(src_file, uncleaned_dest_file)
-
-            tmdb_id = extract_tmdb_id_from_show_folder(show_folder)
-            log_media_item(src_file, cleaned_dest_file, tmdb_id)
+            operations.append(('link', src_file, uncleaned_dest_file, None, 0 if chosen else 1))
+
+    run_operations(writer, folder_path, operations)
+    log_episode_sources(candidates, {key: selected[key][0] for key, _, _, _ in candidates})
+    writer.close()
+    return show_names
+
+def relink_library(relative=True, batch_size=1000):
+    """Rewrite every link recorded in MediaItems (and its Uncleaned twin) as relative or absolute.
+
+    Each link follows its library's relative_links; relative applies to links outside every library.
+    """
+    libraries = get_libraries()
+    rewritten = 0
+    writers = {flag: LinkWriter(relative=flag) for flag in (False, True)}
+    try:
+        for src_file, symlink in iter_media_items(batch_size):
+            library = library_for_path(src_file, libraries)
+            writer = writers[bool(library.get('relative_links')) if library else relative]
+            if writer.relink(src_file, symlink):
+                rewritten += 1
+            if library:
+                uncleaned_dir = os.path.join(library['dest_dir'], "Uncleaned")
+                uncleaned_dest_file = uncleaned_path(uncleaned_dir, library['src_dir'], src_file)
+                if uncleaned_dest_file != symlink and writer.relink(src_file, uncleaned_dest_file):
+                    rewritten += 1
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return rewritten
+
+def suggest_catalog_matches(folder_paths, limit=5, score_cutoff=60):
+    """Score every unresolved folder against the local TmdbSeriesNames catalog in one batch."""
+    from matcher import extract_many
+    catalog = get_all_tmdb_series_names()
+    if not catalog or not folder_paths:
+        return {}
+    queries = [extract_show_name_from_path(folder_path) or '' for folder_path in folder_paths]
+    titles = [series_name for _, series_name, _ in catalog]
+    suggestions = {}
+    for folder_path, best in zip(folder_paths, extract_many(queries, titles, limit=limit, score_cutoff=score_cutoff)):
+        suggestions[folder_path] = [f"{catalog[idx][1]} ({catalog[idx][2]}) [tmdb-{catalog[idx][0]}]" for _, _, idx in best]
+    return suggestions
 
 def process_resolved_matches():
+    """Link folders whose match was resolved out of band; never waits on user input."""
+    resolved = get_resolved_multiple_matches()
+    for folder_path, solution in resolved:
+        logger.info("Processing symlink for resolved match: %s", solution)
+        show_names = process_symlink(folder_path, solution)
+        # Later releases of the same show resolve straight to the chosen folder
+        folder_name = os.path.basename(folder_path)
+        show_names.add(extract_show_name_from_path(folder_path) or '')
+        # A library root's name would catch every later folder under it
+        root_stems = {normalize_show_stem(os.path.basename(library['src_dir'].rstrip(os.sep)))
+                      for library in get_libraries() if library.get('src_dir')}
+        stems = {show_alias_stem(show_name, folder_name) for show_name in show_names} - root_stems - {''}
+        store_show_aliases(stems, solution.replace('[', '{').replace(']', '}').replace('/', ''), 'manual')
+        # Keep the quick scan from retrying a folder that has now been linked
+        log_processed_folder(os.path.join(os.path.basename(os.path.dirname(folder_path)), os.path.basename(folder_path)), 'processed')
+        delete_multiple_match(folder_path)
+    return len(resolved)
+
+def prompt_for_match_resolutions():
+    """Interactively choose matches for the unresolved queue; the daemon links them on its next cycle."""
+    from colorama import init, Fore, Style
+    from tmdb import search_tv_show_by_id, tmdb_search
+    init(autoreset=True)
     unresolved_matches = get_unresolved_multiple_matches()
-    grouped_matches = group_matches_by_folder(unresolved_matches)
+    catalog_suggestions = suggest_catalog_matches([folder_path for folder_path, _, _ in unresolved_matches])
 
-    for folder_path, matches in grouped_matches.items():
-        ids = [match[0] for match in matches]
-        original_names = [match[1] for match in matches]
-        possible_matches = matches[0][2]
+    for folder_path, original_names, possible_matches in unresolved_matches:
+        if possible_matches == ["No results found"] and catalog_suggestions.get(folder_path):
+            possible_matches = catalog_suggestions[folder_path]
 
         while True:
             correct_name = extract_show_name_from_path(folder_path)
             print(f"\nFolder path: {folder_path}")
-            print(f"Original file/show names: {', '.join(original_names)}")
+            print(f"Original file/show names: {original_names}")
             for idx, match in enumerate(possible_matches):
                 print(f"{idx + 1}: {match}")
             print(f"{len(possible_matches) + 1}: No matches, input TMDb manually")
@@ -481,11 +678,8 @@ def process_resolved_matches():
                 choice = int(choice)
                 if 1 <= choice <= len(possible_matches):
                     solution = possible_matches[choice - 1]
-                    for id in ids:
-                        update_multiple_match_solution(id, solution)
-                        print(f"Processing symlink for resolved match: {solution}")
-                        process_symlink(folder_path, solution)
-                        delete_multiple_match(id)
+                    update_multiple_match_solution(folder_path, solution)
+                    print(f"Queued resolved match: {solution}")
                     break
                 elif choice == len(possible_matches) + 1:
                     manual_tmdb_id = input(Fore.YELLOW + "Enter TMDb ID manually: " + Style.RESET_ALL).strip()
@@ -493,11 +687,8 @@ def process_resolved_matches():
                         show_folder = search_tv_show_by_id(manual_tmdb_id)
                         if show_folder:
                             show_folder = show_folder.replace('[', '{').replace(']', '}')
-                            for id in ids:
-                                update_multiple_match_solution(id, show_folder)
-                                print(f"Processing symlink for manually entered TMDb ID: {show_folder}")
-                                process_symlink(folder_path, show_folder)
-                                delete_multiple_match(id)
+                            update_multiple_match_solution(folder_path, show_folder)
+                            print(f"Queued manually entered TMDb ID: {show_folder}")
                             break
                 elif choice == len(possible_matches) + 2:
                     search_query = input(Fore.YELLOW + f"Enter search term for TMDb (default: {correct_name}): " + Style.RESET_ALL).strip()
@@ -514,37 +705,196 @@ def process_resolved_matches():
                 print("Skipping this match")
                 break
 
-
-if __name__ == "__main__":
+def link_library(library, force=False, quick_scan=False, folders=None, retry=False, workers=None):
+    """Scan one library and refresh its Plex sections if anything was linked."""
+    options = dict(force=force, id=library.get('id') or 'tmdb', relative_links=bool(library.get('relative_links')),
+                   episode_titles=bool(library.get('episode_titles')))
+    try:
+        if retry:
+            count = retry_due_matches(library['src_dir'], library['dest_dir'], library['dest_dir_movies'], **options)
+        else:
+            count = create_symlinks(library['src_dir'], library['dest_dir'], library['dest_dir_movies'],
+                                    quick_scan=quick_scan, workers=workers, folders=folders, **options)
+    except Exception as e:
+        logger.exception("Error scanning library %s: %s", library['name'], e)
+        return 0
+    if count:
+        refresh_library(library)
+    return count
+
+def for_each_library(func):
+    """Run func on every library side by side; they share the TMDb session and rate budget, the caches and the series index."""
+    libraries = get_libraries()
+    with ThreadPoolExecutor(max_workers=len(libraries) or 1, thread_name_prefix='library') as executor:
+        return sum(executor.map(func, libraries))
+
+def link_folders(folders, force=False):
+    """Link the named folders (absolute, or torrent names under a src_dir) in whichever library holds them."""
+    routed = resolve_folders(get_libraries(), folders)
+
+    def link_routed(library):
+        existing_folders, removed_folders = routed.get(library['name'], ([], []))
+        for folder in removed_folders:
+            mark_folder_deprecated(folder + os.sep)
+            # A torrent that comes back (e.g. after a repair) must be linked again, not skipped as seen
+            with processed_files_lock:
+                processed_files.difference_update([path for path in processed_files if path.startswith(folder + os.sep)])
+        return link_library(library, force=force, folders=existing_folders) if existing_folders else 0
+
+    return for_each_library(link_routed)
+
+def require_settings():
+    missing = missing_settings()
+    if missing and is_headless():
+        print(f"Missing configuration in {SETTINGS_FILE}: {', '.join(missing)}")
+        print(f"Set them in the file or through {', '.join(env_var_name(key.split('.')[-1]) for key in missing)}")
+        raise SystemExit(1)
+    if missing:
+        print("Missing configuration in settings.json. Please provide necessary inputs.")
+        prompt_for_settings()
+    return get_settings()
+
+def scan_command(args, settings):
+    """Link new folders once and exit; meant for cron jobs and library update hooks."""
+    require_settings()
+    if args.folders:
+        count = link_folders(args.folders, force=args.force)
+    else:
+        count = for_each_library(lambda library: link_library(library, force=args.force, quick_scan=not args.full, workers=args.workers))
+    count += process_resolved_matches()
+    print(f"Linked {count} folder(s)")
+
+def watch_command(args, settings):
+    from webhook import start_webhook_server, take_folders, wait_for_folders, pending_folder_count
+    settings = require_settings()
+    if args.full_scan:
+        for library in get_libraries():
+            link_library(library, force=args.force, workers=args.workers)
+
+    def on_settings_change(new_settings, old_settings):
+        changed = sorted(key for key in set(new_settings) | set(old_settings) if new_settings.get(key) != old_settings.get(key))
+        logger.info("Settings reloaded, changed: %s", ', '.join(changed))
+        if 'log_level' in changed:
+            set_log_level(new_settings.get('log_level'))
+
+    subscribe(on_settings_change)
+
+    webhook_port = settings.get('webhook_port')
+    if webhook_port:
+        start_webhook_server(settings.get('webhook_host') or '127.0.0.1', webhook_port)
+    # With hooks delivering changes, the full poll is only a safety net
+    poll_interval = settings.get('poll_interval') or (300 if webhook_port else 60)
+
+    def process_hooks():
+        folders = take_folders()
+        if not folders:
+            return 0
+        return link_folders(folders, force=args.force) or len(folders)
+
+    def sync_overseerr():
+        from tmdb import update_series_names_from_overseer
+        return update_series_names_from_overseer()
+
+    # Each task polls at its minimum interval right after finding work and backs off to its maximum while idle.
+    # Lanes run in priority order, so the first link pass finishes before the (slow) Overseerr sync starts.
+    scheduler = Scheduler()
+    scheduler.add(Task('hooks', 'fresh', process_hooks, 60, 60, pending=pending_folder_count))
+    scheduler.add(Task('scan', 'fresh', lambda: for_each_library(lambda library: link_library(library, force=args.force, quick_scan=True)), 10, poll_interval))
+    scheduler.add(Task('resolved', 'resolved', process_resolved_matches, 10, 60))
+    scheduler.add(Task('retry', 'retry', lambda: for_each_library(lambda library: link_library(library, force=args.force, retry=True)), 60, 900))
+    scheduler.add(Task('overseerr', 'backfill', sync_overseerr, 600, 3600))
+    scheduler.add(Task('report', 'backfill', scheduler.report, 120, 120))
+    scheduler.run_forever(wait_for_folders, on_wake=lambda: scheduler.trigger('hooks'))
+
+def resolve_command(args, settings):
+    prompt_for_match_resolutions()
+
+def reconcile_command(args, settings):
+    reconcile_library(get_libraries(), repair=args.repair)
+
+def relink_command(args, settings):
+    rewritten = relink_library(relative=settings.get('relative_links', False))
+    print(f"Rewrote {rewritten} links")
+
+def import_catalog_command(args, settings):
+    imported = import_tmdb_catalog(args.export)
+    print(f"Imported {imported} series into the local TMDb catalog")
+
+def stats_command(args, settings):
+    for library in get_libraries():
+        print(f"Library {library['name']}: {library.get('src_dir')} -> {library.get('dest_dir')}, {library.get('dest_dir_movies')}")
+    for label, count in get_stats():
+        print(f"{label}: {count}")
+
+COMMANDS = {
+    'scan': scan_command,
+    'watch': watch_command,
+    'resolve': resolve_command,
+    'reconcile': reconcile_command,
+    'relink': relink_command,
+    'import-catalog': import_catalog_command,
+    'stats': stats_command,
+}
+
+def add_common_options(parser, defaults=True):
+    # Accepted before or after the subcommand; the subcommand copies only set what was given
+    default = (lambda value: value) if defaults else (lambda value: argparse.SUPPRESS)
+    parser.add_argument("--headless", action="store_true", default=default(False), help="Never prompt; take settings from settings.json and PLEX_SYMLINK_* environment variables and exit if any are missing")
+    parser.add_argument("--force", action="store_true", default=default(False), help="Disregards user input and automatically chooses the first option")
+    parser.add_argument("--workers", type=int, default=default(os.cpu_count()), help="Processes used to parse folders during a full scan")
+    parser.add_argument("--log-level", default=default(None), help="DEBUG, INFO, WARNING or ERROR; overrides the log_level setting (default INFO)")
+    parser.add_argument("--log-format", choices=('text', 'json'), default=default(None), help="Overrides the log_format setting; json writes one object per line")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Create symlinks for files from src_dir in dest_dir.")
+    add_common_options(parser)
+    # The pre-subcommand flags still work; without a subcommand the daemon runs
+    parser.add_argument("--full-scan", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--resolve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--relink", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--reconcile", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--repair", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--import-catalog", dest="export", metavar="EXPORT", help=argparse.SUPPRESS)
+    subparsers = parser.add_subparsers(dest="command")
+
+    def add_command(name, help):
+        subparser = subparsers.add_parser(name, help=help, description=help)
+        add_common_options(subparser, defaults=False)
+        return subparser
+
+    scan = add_command('scan', "Link new folders once, plus queued resolutions, and exit")
+    scan.add_argument("folders", nargs="*", metavar="FOLDER", help="Only link these folders (absolute paths or names under a src_dir)")
+    scan.add_argument("--full", action="store_true", help="Walk the whole source tree instead of only unprocessed top-level folders")
+    watch = add_command('watch', "Run the daemon: poll, accept hooks, retry unmatched folders and sync Overseerr")
+    # SUPPRESS keeps the top-level flag when the subcommand doesn't repeat it: --full-scan watch
+    watch.add_argument("--full-scan", action="store_true", default=argparse.SUPPRESS,
+                       help="Walk the whole source tree once before polling for new folders")
+    add_command('resolve', "Answer the queue of unmatched folders and exit; a running daemon links them on its next cycle")
+    reconcile = add_command('reconcile', "Compare the Cleaned/Uncleaned trees with the database, report differences and exit")
+    reconcile.add_argument("--repair", action="store_true", default=argparse.SUPPRESS,
+                           help="Fix missing, dangling, duplicate and orphaned links")
+    add_command('relink', "Rewrite existing library links as relative or absolute, following the relative_links setting, and exit")
+    import_catalog = add_command('import-catalog', "Import a TMDb daily TV series ID export (.json.gz) into the local catalog and exit")
+    import_catalog.add_argument("export", metavar="EXPORT")
+    add_command('stats', "Print library and database counts and exit")
+
+    args = parser.parse_args(argv)
+    if args.command is None:
+        legacy = [('export', 'import-catalog'), ('resolve', 'resolve'), ('reconcile', 'reconcile'), ('relink', 'relink')]
+        args.command = next((command for flag, command in legacy if getattr(args, flag)), 'watch')
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.headless:
+        set_headless()
     settings = get_settings()
+    # Log lines go through a queue to a writer thread; --log-level DEBUG shows every file and search
+    setup_logging(args.log_level or settings.get('log_level') or 'INFO', args.log_format or settings.get('log_format') or 'text')
     initialize_db()
+    # Links a previous run journalled but never committed are finished before anything else reads the DB
+    replay_journal(get_libraries(), relative_links=settings.get('relative_links', False))
+    COMMANDS[args.command](args, settings)
 
-    parser = argparse.ArgumentParser(description="Create symlinks for files from src_dir in dest_dir.")
-    parser.add_argument("--force", action="store_true", help="Disregards user input and automatically chooses the first option")
-    args = parser.parse_args()
-
-    if 'src_dir' not in settings or 'dest_dir' not in settings or 'dest_dir_movies' not in settings or 'id' not in settings or 'tmdb_api_key' not in settings:
-        print("Missing configuration in settings.json. Please provide necessary inputs.")
-        settings = prompt_for_settings()
-        src_dir = settings['src_dir']
-        dest_dir = settings['dest_dir']
-        dest_dir_movies = settings['dest_dir_movies']
-        id_choice = settings['id']
-    else:
-        src_dir = settings['src_dir']
-        dest_dir = settings['dest_dir']
-        dest_dir_movies = settings['dest_dir_movies']
-        id_choice = settings['id']
-
-    last_report_time = datetime.now()
-
-    while True:
-        current_time = datetime.now()
-        if (current_time - last_report_time) > timedelta(minutes=2):
-            print("Still checking for new files...")
-            last_report_time = current_time
-        
-        update_series_names_from_overseer()
-        create_symlinks(src_dir, dest_dir, dest_dir_movies, force=args.force, id=id_choice, quick_scan=True)
-        process_resolved_matches()
-        time.sleep(10)  # Poll every 10 seconds
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import time
+
+import pytest
+
+from episodes import episode_identifier, episode_show_name, parse_episode, parse_identifier, season_folder
+
+
+def parsed(filename):
+    episode = parse_episode(filename)
+    if episode is None:
+        return None, None
+    return episode_identifier(episode), season_folder(episode)
+
+
+EPISODES = [
+    # SxxEyy
+    ('Breaking.Bad.S01E01.720p.mkv', 'S01E01', 'Season 1'),
+    ('Breaking Bad S01 E02 1080p.mkv', 'S01E02', 'Season 1'),
+    ('S02E05.mkv', 'S02E05', 'Season 2'),
+    ('Show.S01E01E02.mkv', 'S01E01-E02', 'Season 1'),
+    ('Show.S01E01-E03.1080p.mkv', 'S01E01-E03', 'Season 1'),
+    ('Show.S01E01-03.mkv', 'S01E01-E03', 'Season 1'),
+    ('Show.S01E01-720p.mkv', 'S01E01', 'Season 1'),
+    ('Show.S10E100.mkv', 'S10E100', 'Season 10'),
+    ('Show.1920x1080.S01E04.mkv', 'S01E04', 'Season 1'),
+    ('Breaking.Bad.S05E14.Ozymandias.1080p.BluRay.x264-ROVERS.mkv', 'S05E14', 'Season 5'),
+    ('the.office.us.s02e01.720p.web.h264.mkv', 'S02E01', 'Season 2'),
+    ('Show.S03E07.DD5.1x264-GRP.mkv', 'S03E07', 'Season 3'),
+    ('Show.S01E01.1080p.x265.10bit.mkv', 'S01E01', 'Season 1'),
+    ('Show.S01E01-E02-E03.mkv', 'S01E01-E03', 'Season 1'),
+    # NxNN
+    ('Show.1x01.mkv', 'S01E01', 'Season 1'),
+    ('Show 2x10-2x11.mkv', 'S02E10-E11', 'Season 2'),
+    ('Show.2x05.720p.x264.mkv', 'S02E05', 'Season 2'),
+    ('Show.3x12.DD5.1x264.mkv', 'S03E12', 'Season 3'),
+    ('Show.12x03.mkv', 'S12E03', 'Season 12'),
+    ('Show.1x01-03.mkv', 'S01E01-E03', 'Season 1'),
+    ('Show.2x10.2160p.HDR.mkv', 'S02E10', 'Season 2'),
+    # Air dates
+    ('The.Daily.Show.2024.01.15.1080p.mkv', '2024-01-15', 'Season 2024'),
+    ('Late Night 2023-12-31.mkv', '2023-12-31', 'Season 2023'),
+    ('Show.1999.12.31.mkv', '1999-12-31', 'Season 1999'),
+    ('The Tonight Show 2024 03 05 Guest.mkv', '2024-03-05', 'Season 2024'),
+    # Absolute numbering
+    ('[SubsPlease] One Piece - 1071 (1080p) [ABCD1234].mkv', 'S01E1071', 'Season 1'),
+    ('[Group] Frieren - 12v2 [1080p].mkv', 'S01E12', 'Season 1'),
+    ('[Erai-raws] Show - 03 [720p].mkv', 'S01E03', 'Season 1'),
+    ('[Group] Show - 01v3.mkv', 'S01E01', 'Season 1'),
+    ('Show - 999.mkv', 'S01E999', 'Season 1'),
+]
+
+NOT_EPISODES = [
+    # Audio channels glued to the codec look like NxNNN
+    'Movie.2019.DD5.1x264-GRP.mkv',
+    'Movie.2019.DTS-HD.MA.7.1x264.mkv',
+    'Movie.2019.AAC2.0x265.mkv',
+    'Movie.2019.1080p.WEB-DL.DDP5.1.x264-GRP.mkv',
+    'Movie.2021.2160p.UHD.BluRay.TrueHD.7.1.Atmos.x265-GRP.mkv',
+    # Resolutions
+    'Movie.1280x720.mkv',
+    'Movie.720x480.mkv',
+    # Dates that don't exist
+    'Show.2024.01.32.mkv',
+    'Show.2024.13.01.mkv',
+    # Years and other numbers
+    'Some Movie - 2019 [1080p].mkv',
+    'Some.Movie.2012.1080p.BluRay.x264.mkv',
+    'Movie.2160p.HEVC.mkv',
+    'featurette.mkv',
+    'Show - 1999.mkv',
+    'Movie.Part.2.mkv',
+    'Movie.2001.A.Space.Odyssey.1968.mkv',
+    'Show.E05.mkv',
+    'sample.mkv',
+    'RARBG.txt',
+]
+
+
+@pytest.mark.parametrize('filename, identifier, season', EPISODES)
+def test_parse_episode(filename, identifier, season):
+    assert parsed(filename) == (identifier, season)
+
+
+@pytest.mark.parametrize('filename', NOT_EPISODES)
+def test_not_an_episode(filename):
+    assert parse_episode(filename) is None
+
+
+@pytest.mark.parametrize('filename, folder_name, show_name', [
+    ('Breaking.Bad.S01E01.720p.mkv', 'Breaking.Bad.S01.720p', 'Breaking Bad'),
+    ('[SubsPlease] One Piece - 1071 (1080p) [ABCD1234].mkv', 'One Piece', 'One Piece'),
+    ('S02E05.mkv', 'The.Expanse.S02.1080p', 'The Expanse'),
+    ('1x01.mkv', 'Firefly-Season 1', 'Firefly'),
+])
+def test_episode_show_name(filename, folder_name, show_name):
+    assert episode_show_name(parse_episode(filename), folder_name) == show_name
+
+
+@pytest.mark.parametrize('identifier, expected', [
+    ('S01E02', (1, 2)),
+    ('S10E100-E102', (10, 100)),
+    ('2024-01-15', None),
+    (None, None),
+])
+def test_parse_identifier(identifier, expected):
+    assert parse_identifier(identifier) == expected
+
+
+def benchmark(repeat=20000):
+    """Parser throughput over the names above: python -m tests.test_episodes"""
+    names = [filename for filename, _, _ in EPISODES] + NOT_EPISODES
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for name in names:
+            parse_episode(name)
+    elapsed = time.perf_counter() - start
+    total = repeat * len(names)
+    print(f"parse_episode: {total} names in {elapsed:.3f}s ({total / elapsed:,.0f} names/s)")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,66 @@
+import sqlite3
+
+import pytest
+
+import db
+import journal
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db.initialize_db()
+    src = tmp_path / 'torrents' / 'Show.S01'
+    src.mkdir(parents=True)
+    for name in ('Show.S01E01.mkv', 'Show.S01E02.mkv'):
+        (src / name).touch()
+    cleaned = tmp_path / 'shows' / 'Cleaned'
+    cleaned.mkdir(parents=True)
+    # A stray file where the first episode's show directory belongs
+    (cleaned / 'Blocked').touch()
+    operations = [
+        ('replace', str(src / 'Show.S01E01.mkv'), str(cleaned / 'Blocked' / 'Season 1' / 'Show - S01E01.mkv'), '1', 1),
+        ('replace', str(src / 'Show.S01E02.mkv'), str(cleaned / 'Show' / 'Season 1' / 'Show - S01E02.mkv'), '1', 1),
+        ('processed', None, 'torrents/Show.S01', None, 0),
+    ]
+    return str(src), operations
+
+
+def rows(query):
+    conn = sqlite3.connect(db.DB_FILE)
+    result = conn.execute(query).fetchall()
+    conn.close()
+    return result
+
+
+def test_replay_skips_failing_operation(library):
+    folder, operations = library
+    journal.record_operations(folder, operations)
+
+    assert journal.replay_journal() == 1
+    assert rows('SELECT COUNT(*) FROM LinkJournal') == [(0,)]
+    assert rows('SELECT symlink FROM MediaItems') == [(operations[1][2],)]
+    # Not marked processed, so the next scan tries the folder again
+    assert rows('SELECT COUNT(*) FROM ProcessedFolders') == [(0,)]
+    assert journal.replay_journal() == 0
+
+
+def test_replay_discards_folder_that_raises(library, monkeypatch):
+    folder, operations = library
+    journal.record_operations(folder, operations)
+
+    def broken(*args):
+        raise RuntimeError("corrupt entry")
+
+    monkeypatch.setattr(journal, 'apply_operations', broken)
+    assert journal.replay_journal() == 1
+    assert rows('SELECT COUNT(*) FROM LinkJournal') == [(0,)]
+    assert rows('SELECT COUNT(*) FROM MediaItems') == [(0,)]
+
+
+def test_run_operations_commits_the_rest(library):
+    folder, operations = library
+    with journal.LinkWriter() as writer:
+        assert journal.run_operations(writer, folder, operations) == 1
+    assert rows('SELECT COUNT(*) FROM LinkJournal') == [(0,)]
+    assert rows('SELECT symlink FROM MediaItems') == [(operations[1][2],)]
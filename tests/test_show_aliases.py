@@ -0,0 +1,60 @@
+import json
+import os
+
+import pytest
+
+import config
+import db
+import symlinkcreator
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # Zurg's layout: every torrent is a top-level folder of __all__
+    src_dir = tmp_path / 'zurg' / '__all__'
+    src_dir.mkdir(parents=True)
+    settings = {'src_dir': str(src_dir), 'dest_dir': str(tmp_path / 'shows'),
+                'dest_dir_movies': str(tmp_path / 'movies'), 'id': 'tmdb', 'tmdb_api_key': 'key'}
+    (tmp_path / 'settings.json').write_text(json.dumps(settings))
+    monkeypatch.setattr(config, '_settings', None)
+    monkeypatch.setattr(symlinkcreator, 'processed_files', set())
+    db.initialize_db()
+    return settings
+
+
+def make_folder(src_dir, name, files, dirs=()):
+    folder = os.path.join(src_dir, name)
+    for directory in dirs:
+        os.makedirs(os.path.join(folder, directory))
+    os.makedirs(folder, exist_ok=True)
+    for file in files:
+        open(os.path.join(folder, file), 'w').close()
+    return folder
+
+
+def test_extract_show_name_uses_top_level_folder(library):
+    src_dir = library['src_dir']
+    assert symlinkcreator.extract_show_name_from_path(os.path.join(src_dir, 'Obscure.Show.S02')) == 'Obscure Show'
+    assert symlinkcreator.extract_show_name_from_path(os.path.join(src_dir, 'Obscure.Show', 'Season 2')) == 'Obscure Show'
+
+
+def test_resolution_never_aliases_library_root(library):
+    src_dir = library['src_dir']
+    folder = make_folder(src_dir, 'Obscure.Show.S02', ['Obscure.Show.S02E01.mkv'])
+    db.log_multiple_match('Obscure.Show.S02', ["No results found"], folder)
+    db.update_multiple_match_solution(folder, 'Obscure Show (2019) [tmdb-999]')
+
+    assert symlinkcreator.process_resolved_matches() == 1
+    aliases = db.get_show_aliases()
+    assert aliases.get('obscure show') == 'Obscure Show (2019) {tmdb-999}'
+    assert 'all' not in aliases
+
+    # A later folder with a non-episode entry must not inherit the resolved show
+    db.store_tmdb_series_name(5, 'Random Show', 2020)
+    make_folder(src_dir, 'Random.Show.S01', ['Random.Show.S01E01.mkv'], dirs=['Subs'])
+    symlinkcreator.create_symlinks(src_dir, library['dest_dir'], library['dest_dir_movies'], quick_scan=True)
+    cleaned = os.listdir(os.path.join(library['dest_dir'], 'Cleaned'))
+    assert 'Random Show (2020) {tmdb-5}' in cleaned
+    obscure = os.path.join(library['dest_dir'], 'Cleaned', 'Obscure Show (2019) {tmdb-999}')
+    assert os.listdir(obscure) == ['Season 2']
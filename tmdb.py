@@ -1,10 +1,59 @@
 import requests
-from functools import lru_cache
-from config import get_overseer_settings, get_api_key, prompt_for_api_key
-from db import store_tmdb_series_name, get_tmdb_series_name, log_multiple_match, build_inverted_index, search_inverted_index
-from fuzzywuzzy import fuzz
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from config import get_overseer_settings, get_api_key, prompt_for_api_key, subscribe
+from db import store_tmdb_series_name, get_tmdb_series_name, log_multiple_match, build_inverted_index, search_inverted_index, find_tmdb_catalog_exact, set_tmdb_catalog_year, get_cached_tmdb_search, store_tmdb_search, get_cached_tmdb_seasons, store_tmdb_seasons
+from matcher import extract
 import re
 
+logger = logging.getLogger(__name__)
+
+# Search responses are persisted so a restarted daemon doesn't repeat last week's lookups
+SEARCH_CACHE_TTL = 7 * 24 * 60 * 60
+# Episode titles of airing seasons fill in over time, so seasons are refetched sooner
+SEASON_CACHE_TTL = 3 * 24 * 60 * 60
+SEASON_FETCH_WORKERS = 8
+
+# One pooled session and one request budget shared by every library the daemon scans
+TMDB_REQUESTS_PER_SECOND = 40
+_session = requests.Session()
+_rate_lock = threading.Lock()
+_next_request_time = 0.0
+
+def cache_found(func):
+    """Memoize results in process, but only hits.
+
+    A miss is asked again on the next call, so a folder the scheduler retries after its backoff
+    actually reaches TMDb instead of replaying the empty answer from its first attempt.
+    """
+    cache = {}
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (args, tuple(sorted(kwargs.items())))
+        if key in cache:
+            return cache[key]
+        result = func(*args, **kwargs)
+        if result:
+            cache[key] = result
+        return result
+
+    wrapper.cache_clear = cache.clear
+    return wrapper
+
+def tmdb_get(url, params=None):
+    global _next_request_time
+    with _rate_lock:
+        now = time.monotonic()
+        wait = _next_request_time - now
+        _next_request_time = max(now, _next_request_time) + 1.0 / TMDB_REQUESTS_PER_SECOND
+    if wait > 0:
+        time.sleep(wait)
+    return _session.get(url, params=params, timeout=10)
+
 def clean_search_query(query):
     year_match = re.search(r'\((\d{4})\)|\b(\d{4})\b', query)
     year = year_match.group(1) or year_match.group(2) if year_match else None
@@ -40,40 +89,68 @@ def clean_search_query(query):
     query = re.sub(r'\s+', ' ', query).strip()
     return query, year
 
-@lru_cache(maxsize=None)
-def search_tv_show(query, year=None, id='tmdb', force=False, folder_path=None):
+@cache_found
+def fetch_tv_search_results(query):
+    cached = get_cached_tmdb_search(query, SEARCH_CACHE_TTL)
+    if cached is not None:
+        return cached
+
     api_key = get_api_key()
     if not api_key:
         api_key = prompt_for_api_key()
+    if not api_key:
+        return []
 
-    query, extracted_year = clean_search_query(query)
-    if not year and extracted_year:
-        year = extracted_year
+    url = "https://api.themoviedb.org/3/search/tv"
+    params = {
+        'api_key': api_key,
+        'query': query
+    }
 
-    def perform_search(year):
-        url = "https://api.themoviedb.org/3/search/tv"
-        params = {
-            'api_key': api_key,
-            'query': query
-        }
-        if year:
-            params['first_air_date_year'] = year
+    try:
+        response = tmdb_get(url, params=params)
+        response.raise_for_status()
+        results = response.json().get('results', [])
+        # Misses aren't persisted; a title TMDb doesn't list yet may be added before the retry
+        if results:
+            store_tmdb_search(query, results)
+        return results
+    except requests.exceptions.RequestException as e:
+        logger.error("Error fetching TMDb data: %s", e)
+        return []
 
-        try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            return response.json().get('results', [])
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching TMDb data: {e}")
-            return []
+def clear_search_caches(new_settings, old_settings):
+    # Results fetched with a missing or revoked key are empty; don't keep serving them
+    if new_settings.get('tmdb_api_key') != old_settings.get('tmdb_api_key'):
+        fetch_tv_search_results.cache_clear()
+        search_tv_show.cache_clear()
+        search_movie.cache_clear()
 
-    results = perform_search(year)
+def rank_results_by_year(results, year, year_tolerance=1):
+    if not year:
+        return results
+    year = int(year)
+    ranked = []
+    for result in results:
+        first_air_date = result.get('first_air_date')
+        if not first_air_date:
+            continue
+        distance = abs(int(first_air_date[:4]) - year)
+        if distance <= year_tolerance:
+            ranked.append((distance, result))
+    # Stable sort keeps TMDb's relevance order among shows from the same year
+    ranked.sort(key=lambda x: x[0])
+    return [result for distance, result in ranked]
 
-    if not results and year:
-        results = perform_search(year + 1)
+@cache_found
+def search_tv_show(query, year=None, id='tmdb', force=False, folder_path=None, year_tolerance=1):
+    query, extracted_year = clean_search_query(query)
+    if not year and extracted_year:
+        year = extracted_year
 
-    if not results and year:
-        results = perform_search(year - 1)
+    # One unfiltered search per query; year tolerance is applied locally instead of
+    # re-querying TMDb with first_air_date_year for every neighbouring year
+    results = rank_results_by_year(fetch_tv_search_results(query), year, year_tolerance)
 
     if results:
         query_stripped = query.lower()
@@ -84,11 +161,10 @@ def search_tv_show(query, year=None, id='tmdb', force=False, folder_path=None):
                 show_year = result['first_air_date'][:4] if result['first_air_date'] else "Unknown Year"
                 return f"{show_name} ({show_year}) {{tmdb-{tmdb_id}}}"
 
-        matches = [(result, fuzz.ratio(query.lower(), result['name'].lower())) for result in results]
-        best_match = max(matches, key=lambda x: x[1])
+        best_match = extract(query, [result['name'] for result in results], limit=1)
 
-        if best_match[1] > 90:
-            chosen_show = best_match[0]
+        if best_match and best_match[0][1] > 90:
+            chosen_show = results[best_match[0][2]]
         else:
             return None
 
@@ -105,6 +181,8 @@ def search_tv_show_by_id(tmdb_id):
     api_key = get_api_key()
     if not api_key:
         api_key = prompt_for_api_key()
+    if not api_key:
+        return None
 
     url = f"https://api.themoviedb.org/3/tv/{tmdb_id}"
     params = {
@@ -112,7 +190,7 @@ def search_tv_show_by_id(tmdb_id):
     }
 
     try:
-        response = requests.get(url, params=params)
+        response = tmdb_get(url, params=params)
         response.raise_for_status()
         show = response.json()
         show_name = show.get('name')
@@ -121,14 +199,50 @@ def search_tv_show_by_id(tmdb_id):
         proper_name = f"{show_name} ({show_year}) {{tmdb-{tmdb_id}}}"
         return proper_name
     except requests.exceptions.RequestException as e:
-        print(f"Error fetching TMDb data for ID {tmdb_id}: {e}")
+        logger.error("Error fetching TMDb data for ID %s: %s", tmdb_id, e)
         return None
 
-@lru_cache(maxsize=None)
+def fetch_season(tmdb_id, season, api_key):
+    """{episode number: title} for one season; {} when TMDb has no such season, None on errors."""
+    url = f"https://api.themoviedb.org/3/tv/{tmdb_id}/season/{season}"
+    try:
+        response = tmdb_get(url, params={'api_key': api_key})
+        if response.status_code == 404:
+            return {}
+        response.raise_for_status()
+        return {episode['episode_number']: episode.get('name') or '' for episode in response.json().get('episodes', [])
+                if episode.get('episode_number') is not None}
+    except requests.exceptions.RequestException as e:
+        logger.error("Error fetching TMDb season %s of %s: %s", season, tmdb_id, e)
+        return None
+
+def get_season_titles(keys):
+    """Episode titles for every (tmdb_id, season) in keys, from the season cache or fetched concurrently.
+
+    Each season costs at most one request per SEASON_CACHE_TTL; seasons that fail to fetch are left out.
+    """
+    keys = {(int(tmdb_id), int(season)) for tmdb_id, season in keys}
+    seasons = get_cached_tmdb_seasons(keys, SEASON_CACHE_TTL)
+    missing = sorted(keys - seasons.keys())
+    api_key = get_api_key()
+    if not missing or not api_key:
+        return seasons
+    with ThreadPoolExecutor(max_workers=min(SEASON_FETCH_WORKERS, len(missing))) as executor:
+        fetched = dict(zip(missing, executor.map(lambda key: fetch_season(key[0], key[1], api_key), missing)))
+    fetched = {key: episodes for key, episodes in fetched.items() if episodes is not None}
+    if fetched:
+        store_tmdb_seasons(fetched)
+        logger.debug("Fetched %d season(s) from TMDb", len(fetched))
+    seasons.update(fetched)
+    return seasons
+
+@cache_found
 def search_movie(query, year=None):
     api_key = get_api_key()
     if not api_key:
         api_key = prompt_for_api_key()
+    if not api_key:
+        return None
 
     url = "https://api.themoviedb.org/3/search/movie"
     params = {
@@ -139,20 +253,22 @@ def search_movie(query, year=None):
         params['year'] = year
 
     try:
-        response = requests.get(url, params=params)
+        response = tmdb_get(url, params=params)
         response.raise_for_status()
         results = response.json().get('results', [])
         if results:
             return results[0]
         return None
     except requests.exceptions.RequestException as e:
-        print(f"Error fetching movie data: {e}")
+        logger.error("Error fetching movie data: %s", e)
         return None
 
 def tmdb_search(query):
     api_key = get_api_key()
     if not api_key:
         api_key = prompt_for_api_key()
+    if not api_key:
+        return []
 
     url = "https://api.themoviedb.org/3/search/tv"
     params = {
@@ -160,18 +276,18 @@ def tmdb_search(query):
         'query': query
     }
     try:
-        response = requests.get(url, params=params)
+        response = tmdb_get(url, params=params)
         response.raise_for_status()
         results = response.json().get('results', [])
         return results
     except requests.exceptions.RequestException as e:
-        print(f"Error fetching TMDb search results: {e}")
+        logger.error("Error fetching TMDb search results: %s", e)
         return []
 
 def get_overseer_requests():
     overseer_api_address, overseer_api_key = get_overseer_settings()
     if not overseer_api_address or not overseer_api_key:
-        print("Overseer API address or key is not set.")
+        logger.warning("Overseer API address or key is not set.")
         return []
 
     url = f"{overseer_api_address}/api/v1/request"
@@ -199,7 +315,7 @@ def get_overseer_requests():
             all_requests.extend(results)
             skip += take
         except requests.exceptions.RequestException as e:
-            print(f"Error fetching Overseer data: {e}")
+            logger.error("Error fetching Overseer data: %s", e)
             break
 
     return all_requests
@@ -208,20 +324,21 @@ def fetch_tmdb_series_name(tmdb_id):
     api_key = get_api_key()
     url = f"https://api.themoviedb.org/3/tv/{tmdb_id}?api_key={api_key}"
     try:
-        response = requests.get(url)
+        response = tmdb_get(url)
         response.raise_for_status()
         data = response.json()
         series_name = data.get('name')
         year = data.get('first_air_date', '').split('-')[0] if data.get('first_air_date') else None
         return series_name, year
     except requests.exceptions.RequestException as e:
-        print(f"Error fetching TMDb data for ID {tmdb_id}: {e}")
+        logger.error("Error fetching TMDb data for ID %s: %s", tmdb_id, e)
         return None, None
 
 def update_series_names_from_overseer():
     requests_data = get_overseer_requests()
     tmdb_id_count = 0
     missing_tmdb_id_count = 0
+    added_count = 0
     for request in requests_data:
         media = request.get('media', {})
         tmdb_id = media.get('tmdbId')
@@ -233,12 +350,14 @@ def update_series_names_from_overseer():
                     series_name, year = fetch_tmdb_series_name(tmdb_id)
                     if series_name:
                         store_tmdb_series_name(tmdb_id, series_name, year)
+                        added_count += 1
         else:
             missing_tmdb_id_count += 1
-            print(f"Missing TMDb ID for request: {request}")
+            logger.debug("Missing TMDb ID for request: %s", request)
 
-    print(f"Total TMDb IDs found: {tmdb_id_count}")
-    print(f"Total requests without TMDb ID: {missing_tmdb_id_count}")
+    logger.info("Overseerr sync: %d TMDb IDs found, %d requests without TMDb ID, %d series added",
+                tmdb_id_count, missing_tmdb_id_count, added_count)
+    return added_count
 
 
 def search_series_using_inverted_index(query):
@@ -246,14 +365,55 @@ def search_series_using_inverted_index(query):
     results = search_inverted_index(query, inverted_index)
     return results
 
+def search_tmdb_catalog(query, catalog_index, year=None, year_tolerance=1, max_candidates=50):
+    """Resolve a show against the locally imported TMDb catalog without touching the search API."""
+    query, extracted_year = clean_search_query(query)
+    if not year and extracted_year:
+        year = extracted_year
+    if not query or not catalog_index:
+        return None
+    year = int(year) if year else None
+
+    def year_matches(series_year):
+        return year is None or not series_year or abs(int(series_year) - year) <= year_tolerance
+
+    def resolve_year(tmdb_id, show_name, show_year):
+        # ID exports have no air dates, so the year comes from the series cache or one /tv/{id} call
+        cached_name, cached_year = get_tmdb_series_name(tmdb_id)
+        if cached_name:
+            show_name, show_year = cached_name, show_year or cached_year
+        if not show_year:
+            fetched_name, show_year = fetch_tmdb_series_name(tmdb_id)
+            if fetched_name:
+                show_name = fetched_name
+                store_tmdb_series_name(tmdb_id, fetched_name, show_year)
+            if not show_year:
+                return show_name, None
+            set_tmdb_catalog_year(tmdb_id, show_year)
+        return show_name, show_year
+
+    candidates = [row for row in find_tmdb_catalog_exact(query) if year_matches(row[2])]
+    if candidates:
+        # Rows sharing the name are tried most popular first until one has the requested year
+        for tmdb_id, show_name, show_year in candidates:
+            show_name, show_year = resolve_year(tmdb_id, show_name, show_year)
+            if show_year and year_matches(show_year):
+                return f"{show_name} ({show_year}) {{tmdb-{tmdb_id}}}"
+        return None
+
+    ranked = search_inverted_index(query, catalog_index, limit=max_candidates)
+    pool = [(tmdb_id, series_name, series_year) for (series_name, tmdb_id, series_year), score in ranked
+            if year_matches(series_year)]
+    best_match = extract(query, [series_name for _, series_name, _ in pool], limit=1)
+    if not best_match or best_match[0][1] <= 90:
+        return None
+    tmdb_id, show_name, show_year = pool[best_match[0][2]]
+    show_name, show_year = resolve_year(tmdb_id, show_name, show_year)
+    if not show_year or not year_matches(show_year):
+        return None
+    return f"{show_name} ({show_year}) {{tmdb-{tmdb_id}}}"
+
 def search_tv_show_with_year_range(query, year, id, force, folder_path, range_delta):
-    if year is not None:
-        for delta in range(-range_delta, range_delta + 1):
-            result = search_tv_show(query, year + delta, id=id, force=force, folder_path=folder_path)
-            if result:
-                return result
-    else:
-        result = search_tv_show(query, year, id=id, force=force, folder_path=folder_path)
-        if result:
-            return result
-    return None
\ No newline at end of file
+    return search_tv_show(query, year, id=id, force=force, folder_path=folder_path, year_tolerance=range_delta)
+
+subscribe(clear_search_caches)
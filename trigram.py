@@ -0,0 +1,167 @@
+import heapq
+import random
+import re
+import string
+import sys
+import time
+import tracemalloc
+from array import array
+from collections import Counter, defaultdict
+
+numpy = None  # imported by the first search; it is most of this module's import time
+
+
+def load_numpy():
+    global numpy
+    if numpy is None:
+        try:
+            import numpy as module
+        except ImportError:
+            module = False
+        numpy = module
+    return numpy
+
+
+def generate_ngrams(text, n=3):
+    text = text.lower()
+    text = re.sub(r'[^a-z0-9\s.]', '', text)  # Keep periods
+    words = text.split()
+    ngrams = set()
+    for word in words:
+        for i in range(len(word) - n + 1):
+            ngrams.add(word[i:i+n])
+    return ngrams
+
+
+class TrigramIndex:
+    """Trigram index over series titles with integer postings.
+
+    Every title gets a document id; titles, TMDb ids and years live in parallel columns and each
+    trigram maps to a sorted array('I') of document ids, so a title is stored once instead of once
+    per trigram. Scores are counted over the concatenated postings (with numpy when available).
+    """
+
+    def __init__(self, series=()):
+        self.titles = []
+        self.tmdb_ids = array('I')
+        self.years = array('H')  # 0 means the year is unknown
+        self.postings = {}
+        for tmdb_id, series_name, year in series:
+            self.add(tmdb_id, series_name, year)
+
+    def __len__(self):
+        return len(self.titles)
+
+    def __contains__(self, ngram):
+        return ngram in self.postings
+
+    def add(self, tmdb_id, series_name, year):
+        doc_id = len(self.titles)
+        self.titles.append(series_name)
+        self.tmdb_ids.append(int(tmdb_id))
+        self.years.append(int(year) if year else 0)
+        for ngram in generate_ngrams(series_name):
+            postings = self.postings.get(ngram)
+            if postings is None:
+                postings = self.postings[ngram] = array('I')
+            postings.append(doc_id)
+
+    def document(self, doc_id):
+        return (self.titles[doc_id], self.tmdb_ids[doc_id], self.years[doc_id] or None)
+
+    def search(self, query, year=None, year_tolerance=0, limit=None):
+        """Return [((series_name, tmdb_id, year), score)], best trigram overlap first, then closest year.
+
+        With a limit only the top `limit` results are ranked and built; the order is the same as the
+        head of the full list.
+        """
+        postings = [self.postings[ngram] for ngram in generate_ngrams(query) if ngram in self.postings]
+        if not postings or limit == 0:
+            return []
+        year = int(year) if year else None
+        if load_numpy():
+            ranked = self._rank_numpy(postings, year, year_tolerance, limit)
+        else:
+            ranked = self._rank_python(postings, year, year_tolerance, limit)
+        return [(self.document(doc_id), score) for doc_id, score in ranked]
+
+    def _rank_numpy(self, postings, year, year_tolerance, limit=None):
+        doc_ids, scores = numpy.unique(numpy.concatenate([numpy.frombuffer(p, dtype=numpy.uint32) for p in postings]),
+                                       return_counts=True)
+        distance = numpy.zeros(len(doc_ids), dtype=numpy.int64)
+        if year is not None:
+            years = numpy.frombuffer(self.years, dtype=numpy.uint16)[doc_ids].astype(numpy.int64)
+            distance = numpy.abs(years - year)
+            keep = (years != 0) & (distance <= year_tolerance)
+            doc_ids, scores, distance = doc_ids[keep], scores[keep], distance[keep]
+        # One unique int64 key per document orders by score, then year distance, then doc id,
+        # so the top k can be picked with argpartition instead of sorting every hit
+        key = ((len(postings) - scores.astype(numpy.int64)) << 48) | (distance << 32) | doc_ids.astype(numpy.int64)
+        if limit is not None and limit < len(key):
+            top = numpy.argpartition(key, limit - 1)[:limit]
+            order = top[numpy.argsort(key[top])]
+        else:
+            order = numpy.argsort(key)
+        return zip(doc_ids[order].tolist(), scores[order].tolist())
+
+    def _rank_python(self, postings, year, year_tolerance, limit=None):
+        counts = Counter()
+        for doc_ids in postings:
+            counts.update(doc_ids)
+        ranked = []
+        for doc_id, score in counts.items():
+            distance = 0
+            if year is not None:
+                series_year = self.years[doc_id]
+                distance = abs(series_year - year)
+                if not series_year or distance > year_tolerance:
+                    continue
+            ranked.append((-score, distance, doc_id))
+        ranked = heapq.nsmallest(limit, ranked) if limit is not None else sorted(ranked)
+        return [(doc_id, -score) for score, _, doc_id in ranked]
+
+
+def benchmark(num_titles=100000, num_queries=200, seed=0):
+    """Compare memory and query time of TrigramIndex with the tuple-per-posting lists it replaced."""
+    rng = random.Random(seed)
+    load_numpy()  # keep the one-off import out of the query timings
+
+    def random_title():
+        words = [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9))) for _ in range(rng.randint(1, 4))]
+        return ' '.join(words).title()
+
+    series = [(tmdb_id, random_title(), rng.randint(1950, 2025)) for tmdb_id in range(1, num_titles + 1)]
+    queries = [rng.choice(series)[1] for _ in range(num_queries)]
+
+    def build_lists():
+        inverted_index = defaultdict(list)
+        for tmdb_id, series_name, year in series:
+            for ngram in generate_ngrams(series_name):
+                inverted_index[ngram].append((series_name, tmdb_id, year))
+        return inverted_index
+
+    def search_lists(inverted_index, query):
+        results = defaultdict(int)
+        for ngram in generate_ngrams(query):
+            for entry in inverted_index.get(ngram, ()):
+                results[entry] += 1
+        return sorted(results.items(), key=lambda item: -item[1])
+
+    for name, build, search in (('lists', build_lists, search_lists),
+                                ('trigram', lambda: TrigramIndex(series), lambda index, query: index.search(query))):
+        tracemalloc.start()
+        start = time.perf_counter()
+        index = build()
+        build_time = time.perf_counter() - start
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        start = time.perf_counter()
+        for query in queries:
+            search(index, query)
+        query_time = (time.perf_counter() - start) / num_queries
+        print(f"{name}: built in {build_time:.2f}s, {memory / 2**20:.1f} MiB, {query_time * 1000:.2f} ms/query")
+        del index
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
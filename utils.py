@@ -1,7 +1,11 @@
 import re
+import logging
 import subprocess
 import json
 import os
+import stat
+
+logger = logging.getLogger(__name__)
 
 FFPROBE_PATH = './ffprobe'
 
@@ -41,7 +45,7 @@ def extract_resolution(name, parent_folder_name=None, file_path=None):
             else:
                 raise RuntimeError(f"ffprobe failed with error: {result.stderr}")
         except Exception as e:
-            print(f"Error using ffprobe: {e}")
+            logger.warning("Error using ffprobe: %s", e)
 
     return None
 
@@ -64,7 +68,7 @@ def get_resolution_with_ffprobe(file_path):
         else:
             return f"{width}x{height}"
     except Exception as e:
-        print(f"Error getting resolution with ffprobe: {e}")
+        logger.warning("Error getting resolution with ffprobe: %s", e)
         return None
 
 def extract_folder_year(folder_name):
@@ -79,3 +83,46 @@ def extract_folder_year(folder_name):
 def sanitize_title(name):
     return re.sub(r'[^a-zA-Z0-9\s.]', ' ', name).strip()  # Preserve periods
 
+
+def normalize_show_stem(name, year=None):
+    """Case, punctuation and spacing insensitive key for a show name, e.g. 'the office us 2005'."""
+    stem = ' '.join(re.sub(r'[^a-z0-9]+', ' ', name.lower()).split())
+    if stem and year:
+        stem = f"{stem} {year}"
+    return stem
+
+CODEC_RANKS = [
+    (re.compile(r'\bAV1\b', re.IGNORECASE), 3),
+    (re.compile(r'\b(x265|h\.?265|HEVC)\b', re.IGNORECASE), 2),
+    (re.compile(r'\b(x264|h\.?264|AVC)\b', re.IGNORECASE), 1),
+]
+
+def resolution_rank(resolution):
+    """Vertical resolution as a number, so '2160p' > '1080p' > '1280x720' > None."""
+    if not resolution:
+        return 0
+    match = re.search(r'x(\d+)$', resolution) or re.search(r'(\d+)p$', resolution)
+    return int(match.group(1)) if match else 0
+
+def codec_rank(name):
+    name = name.replace('_', ' ')
+    for pattern, rank in CODEC_RANKS:
+        if pattern.search(name):
+            return rank
+    return 0
+
+def release_quality(name, resolution, file_path=None):
+    """Comparable (resolution, size, codec) tuple used to pick one source per episode, and whether
+    file_path is a directory, so callers on a slow mount don't stat it a second time."""
+    size = 0
+    is_dir = False
+    if file_path:
+        try:
+            stat_result = os.stat(file_path)
+            is_dir = stat.S_ISDIR(stat_result.st_mode)
+            # A directory's size says nothing about the video inside it
+            if not is_dir:
+                size = stat_result.st_size
+        except OSError:
+            pass
+    return (resolution_rank(resolution), size, codec_rank(name)), is_dir
@@ -0,0 +1,101 @@
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+_pending = {}  # insertion ordered, doubles as a set
+_pending_lock = threading.Lock()
+_pending_event = threading.Event()
+
+
+def queue_folders(folders):
+    with _pending_lock:
+        for folder in folders:
+            if folder:
+                _pending[folder] = None
+    if folders:
+        _pending_event.set()
+
+
+def take_folders():
+    """Return and clear every folder notified since the last call, oldest first."""
+    with _pending_lock:
+        folders = list(_pending)
+        _pending.clear()
+        _pending_event.clear()
+    return folders
+
+
+def pending_folder_count():
+    with _pending_lock:
+        return len(_pending)
+
+
+def wait_for_folders(timeout):
+    """Sleep up to timeout seconds, waking as soon as a notification arrives."""
+    return _pending_event.wait(timeout)
+
+
+def parse_folders(body, content_type='', query=''):
+    """Accept a JSON list, {"directories": [...]}, one directory per line, or ?directory=... parameters."""
+    folders = []
+    for key in ('directory', 'directories', 'dir'):
+        folders.extend(parse_qs(query).get(key, []))
+    body = body.decode('utf-8', errors='replace').strip() if body else ''
+    if body:
+        if 'json' in content_type or body[:1] in '[{':
+            try:
+                data = json.loads(body)
+            except json.JSONDecodeError:
+                data = None
+            if isinstance(data, dict):
+                data = data.get('directories') or data.get('folders') or data.get('directory') or []
+            if isinstance(data, str):
+                data = [data]
+            if isinstance(data, list):
+                folders.extend(str(folder) for folder in data)
+                body = ''
+        if body:
+            folders.extend(line.strip() for line in body.splitlines())
+    return [folder for folder in folders if folder]
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        folders = parse_folders(body, self.headers.get('Content-Type', ''), url.query)
+        queue_folders(folders)
+        logger.info("Webhook queued %d folder(s)", len(folders))
+        self.send_response(202)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps({'queued': len(folders)}).encode('utf-8'))
+
+    do_PUT = do_POST
+
+    def do_GET(self):
+        # Lets a hook be a plain `curl http://host:port/?directory=...`
+        folders = parse_folders(b'', '', urlparse(self.path).query)
+        queue_folders(folders)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps({'queued': len(folders)}).encode('utf-8'))
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_webhook_server(host='127.0.0.1', port=8700):
+    """Serve change notifications on a daemon thread; returns the server so it can be shut down."""
+    server = ThreadingHTTPServer((host, port), WebhookHandler)
+    thread = threading.Thread(target=server.serve_forever, name='webhook', daemon=True)
+    thread.start()
+    logger.info("Listening for library update hooks on http://%s:%s/", host, port)
+    return server
+